@@ -8,6 +8,8 @@ from services.setting import Setting
 class BoardInfoMenu(BaseUI):
     def __init__(self, setting: Setting):
         super().__init__(setting)
+        self.seek_callback = None
+        self.step_callback = None
         rect = pygame.Rect(-200, 0, 200, setting.HEIGHT)
 
         self.panel = pygame_gui.elements.UIPanel(relative_rect=rect,
@@ -33,12 +35,24 @@ class BoardInfoMenu(BaseUI):
                                                         }
                                                         )
 
+        # First, previous, next and last ply of the game, the last one is the live board
+        self.first_button, self.previous_button, self.next_button, self.last_button = [
+            pygame_gui.elements.UIButton(relative_rect=pygame.Rect(i * 48 + 2, 0, 48, 30),
+                                         manager=self.manager,
+                                         container=self.panel,
+                                         text=text,
+                                         anchors={
+                                             'top_target': self.pgn_output
+                                         })
+            for i, text in enumerate(("<<", "<", ">", ">>"))
+        ]
+
         self.fen_label = pygame_gui.elements.UILabel(relative_rect=pygame.Rect(-25, 0, 100, 25),
                                                      manager=self.manager,
                                                      container=self.panel,
                                                      text="FEN:",
                                                      anchors={
-                                                         'top_target': self.pgn_output
+                                                         'top_target': self.first_button
                                                      })
 
         self.fen_output = pygame_gui.elements.UITextBox(relative_rect=pygame.Rect(0, 0, 195, 200),
@@ -53,5 +67,29 @@ class BoardInfoMenu(BaseUI):
     def set_fen_text(self, text):
         self.fen_output.set_text(text)
 
-    def set_pgn_text(self, text):
-        self.pgn_output.set_text(text)
\ No newline at end of file
+    def set_pgn_moves(self, moves: list[str], ply: int | None):
+        """Moves as links to the ply after them, the browsed one in bold"""
+        text = ""
+        for i, move in enumerate(moves):
+            if i % 2 == 0:
+                text += f"<br>{i // 2 + 1}. "
+            link = f"<a href='{i + 1}'>{move}</a>"
+            text += f"<b>{link}</b> " if ply == i + 1 else f"{link} "
+        self.pgn_output.set_text(text)
+
+    def process_events(self, event: pygame.event.Event):
+        super().process_events(event)
+
+        if event.type == pygame_gui.UI_TEXT_BOX_LINK_CLICKED and event.ui_element == self.pgn_output:
+            self.handle_callback(self.seek_callback, int(event.link_target))
+
+        if event.type == pygame_gui.UI_BUTTON_PRESSED:
+            match event.ui_element:
+                case self.first_button:
+                    self.handle_callback(self.seek_callback, 0)
+                case self.previous_button:
+                    self.handle_callback(self.step_callback, -1)
+                case self.next_button:
+                    self.handle_callback(self.step_callback, 1)
+                case self.last_button:
+                    self.handle_callback(self.seek_callback, None)
\ No newline at end of file
@@ -17,6 +17,10 @@ class ChatGUI(BaseUI):
         self.setting = setting
         self.forfeit_offline_callback = None
         self.undo_callback = None
+        self.redo_callback = None
+        # Browse a game of a file without leaving the live one, and go back to it
+        self.load_callback = None
+        self.live_callback = None
 
         self.socket_service = socket_service
         self.socket_service.on_receive(self.handle_receive)
@@ -162,9 +166,26 @@ class ChatGUI(BaseUI):
             case "/tie":
                 self.text_output_box.append_html_text("--Tie Request--\r\n")
                 self.send_command_message("/tie")
+            case "/redo" if not self.is_online:
+                self.handle_callback(self.redo_callback)
+            case "/live":
+                self.handle_callback(self.live_callback)
+            case _ if message.startswith("/load "):
+                self.load_game(message.split()[1:])
             case _:
                 self.text_output_box.append_html_text('<font color="blue">Command not found.</font>' + '<br><br>')
 
+    def load_game(self, args: list[str]):
+        """/load <path> [game number], the first game by default"""
+        number = int(args.pop()) if len(args) > 1 and args[-1].isdigit() else 1
+        path = " ".join(args)
+        try:
+            self.handle_callback(self.load_callback, path, number - 1)
+        except (OSError, ValueError) as ex:
+            self.text_output_box.append_html_text(f'<font color="red">Cannot load {path}: {ex}</font><br><br>')
+            return
+        self.text_output_box.append_html_text(f"--Browsing game {number} of {path}, /live to go back--\r\n")
+
     def send_chat_message(self, message):
         self.text_output_box.append_html_text(f"You: {message}")
         # data = str(net.id) + ":" + self.text_entry_box.get_text()
@@ -0,0 +1,123 @@
+"""Process-wide cache of the surfaces used by pieces, promotion menus, move markers and the board itself.
+
+Piece images are rasterized from the SVGs at the exact square size, once per size: the result is kept
+in memory and saved under ``cache/sprites/<size>``, so resizing back to a known size only reads small
+PNGs. Without SVG support the bundled PNGs are scaled instead. Rebuilding a board creates sprites
+without any disk I/O or rescaling. Board squares and coordinate glyphs are rendered once
+per font, colour and square size, until ``clear_renders`` drops them for a new theme or window size.
+Surfaces are shared and must not be drawn on.
+"""
+import logging
+import os
+
+import pygame
+from pygame import Surface
+
+SPRITE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "cache", "sprites")
+
+logger = logging.getLogger(__name__)
+
+_sources: dict[str, Surface] = {}
+_fonts: dict[tuple[str, int], pygame.font.Font] = {}
+_images: dict[tuple, Surface] = {}
+# Built before a display mode was set, converted to the display format on the next lookup
+_unconverted: set[tuple] = set()
+
+
+def _get(key: tuple, build, has_alpha=True) -> Surface:
+    image = _images.get(key)
+    has_display = pygame.display.get_surface() is not None
+    if image is not None and (key not in _unconverted or not has_display):
+        return image
+
+    image = build()
+    if has_display:
+        image = image.convert_alpha() if has_alpha else image.convert()
+        _unconverted.discard(key)
+    else:
+        _unconverted.add(key)
+    _images[key] = image
+    return image
+
+
+def _load(path: str) -> Surface:
+    if path not in _sources:
+        _sources[path] = pygame.image.load(path)
+    return _sources[path]
+
+
+def _rasterize(svg_path: str, size: int) -> Surface:
+    """SVG drawn at size x size, read back from the sprite cache when it is newer than the SVG"""
+    cache_path = os.path.join(SPRITE_CACHE_DIR, str(size), os.path.basename(svg_path)[:-4] + ".png")
+    try:
+        if os.path.getmtime(cache_path) >= os.path.getmtime(svg_path):
+            return pygame.image.load(cache_path)
+    except (OSError, pygame.error):
+        pass
+
+    image = pygame.image.load_sized_svg(svg_path, (size, size))
+    # The rasterizer rounds the scale and can miss by a pixel
+    if image.get_size() != (size, size):
+        image = pygame.transform.smoothscale(image, (size, size))
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # Renamed into place, other processes may be reading the same size
+        temp_path = f"{cache_path[:-4]}.{os.getpid()}.png"
+        pygame.image.save(image, temp_path)
+        os.replace(temp_path, cache_path)
+    except (OSError, pygame.error) as ex:
+        logger.warning(f"Cannot cache {cache_path}: {ex}")
+    return image
+
+
+def piece_image(name: str, is_white: bool, size: int) -> Surface:
+    path = f"assets/img/{'white' if is_white else 'black'}_{name.lower()}"
+
+    def build():
+        if hasattr(pygame.image, "load_sized_svg") and os.path.isfile(path + ".svg"):
+            return _rasterize(path + ".svg", size)
+        return pygame.transform.smoothscale(_load(path + ".png"), (size, size))
+
+    return _get((name, is_white, size), build)
+
+
+def filled_image(width: int, height: int, colour) -> Surface:
+    """Plain rectangle, used for move markers and the promotion menu background"""
+    def build():
+        image = Surface((width, height))
+        image.fill(colour)
+        return image
+
+    return _get(("fill", width, height, tuple(pygame.Color(colour))), build, has_alpha=False)
+
+
+def font(path: str, size: int) -> pygame.font.Font:
+    if (path, size) not in _fonts:
+        _fonts[path, size] = pygame.font.Font(path, size)
+    return _fonts[path, size]
+
+
+def glyph(font_path: str, font_size: int, text: str, colour) -> Surface:
+    """Antialiased text on a transparent background"""
+    return _get(("glyph", font_path, font_size, text, tuple(pygame.Color(colour))),
+                lambda: font(font_path, font_size).render(text, True, colour))
+
+
+def board_texture(square_size: int, light, dark) -> Surface:
+    """The 64 squares, a8 in the top left corner"""
+    def build():
+        image = Surface((square_size * 8, square_size * 8))
+        image.fill(dark)
+        for sq in range(64):
+            if (sq % 8 + sq // 8) % 2 == 0:
+                image.fill(light, (sq % 8 * square_size, sq // 8 * square_size, square_size, square_size))
+        return image
+
+    return _get(("board", square_size, tuple(pygame.Color(light)), tuple(pygame.Color(dark))), build, has_alpha=False)
+
+
+def clear_renders() -> None:
+    """Forget the glyphs and board textures, piece images do not depend on the theme"""
+    for key in [key for key in _images if key[0] in ("glyph", "board")]:
+        del _images[key]
+        _unconverted.discard(key)
@@ -0,0 +1,229 @@
+"""Binary game archive with memory-mapped reads.
+
+Layout, all integers little-endian::
+
+    header    magic, version, game count and the offsets of the three tables below
+    moves     every game's moves as packed 16-bit moves (see core.move), back to back
+    index     game count + 1 uint64 offsets into moves, game i spans index[i]:index[i + 1]
+    games     one fixed-size record per game: result code, offset and length of its tags
+    tags      "name\\tvalue\\n" lines, the FEN tag holds the start position of set-up games
+
+Reading a game or a single ply is a few slices of the mapped file, no text is parsed.
+
+    python -m core.archive import games.pgn games.pca
+    python -m core.archive show games.pca 42 --ply 20
+"""
+import argparse
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from typing import Iterable
+
+from core.pgn import PgnGame, read_file
+from core.position import Position, STARTING_FEN
+from core.san import parse_san, move_to_san
+
+MAGIC = b"PYCA"
+VERSION = 1
+HEADER = struct.Struct("<4sHxxIQQQ")
+INDEX_ENTRIES = struct.Struct("<QQ")
+GAME_RECORD = struct.Struct("<BxxxQI")
+RESULTS = ("*", "1-0", "0-1", "1/2-1/2")
+
+
+def _to_bytes(values: array) -> bytes:
+    """Little-endian bytes of an array"""
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+class ArchiveWriter:
+    """Appends games to a new archive, keeping only the per-game offsets in memory"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file = open(path, "wb")
+        self._file.write(bytes(HEADER.size))
+        self._tags = tempfile.TemporaryFile()
+        self._index = array('Q', [HEADER.size])
+        self._records = bytearray()
+
+    def add(self, moves: Iterable[int], result: str = "*", headers: dict[str, str] | None = None) -> int:
+        """Store a game, returning its number"""
+        self._file.write(_to_bytes(array('H', moves)))
+        self._index.append(self._file.tell())
+
+        tags = "".join(f"{name}\t{value}\n" for name, value in (headers or {}).items()
+                       if "\t" not in name + value and "\n" not in name + value).encode()
+        self._records += GAME_RECORD.pack(RESULTS.index(result) if result in RESULTS else 0, self._tags.tell(),
+                                          len(tags))
+        self._tags.write(tags)
+        return len(self._index) - 2
+
+    def add_pgn(self, game: PgnGame) -> int:
+        position = Position(game.fen)
+        moves = array('H')
+        for san in game.moves:
+            move = parse_san(position, san)
+            moves.append(move)
+            position.make_move(move)
+        return self.add(moves, game.result, game.headers)
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+
+        index_offset = self._file.tell()
+        self._file.write(_to_bytes(self._index))
+        games_offset = self._file.tell()
+        self._file.write(self._records)
+        tags_offset = self._file.tell()
+        self._tags.seek(0)
+        shutil.copyfileobj(self._tags, self._file)
+
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, VERSION, len(self._index) - 1, index_offset, games_offset, tags_offset))
+        self._file.close()
+        self._tags.close()
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class Archive:
+    """Read-only view of an archive file through mmap"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            self.close()
+            raise ValueError(f"{path} is too short for a game archive")
+
+        magic, version, self.game_count, self._index_offset, self._games_offset, self._tags_offset = \
+            HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} game archive")
+
+        # A truncated file would otherwise fail on the first read past its end
+        size = len(self._map)
+        if self._index_offset + (self.game_count + 1) * 8 > size \
+                or self._games_offset + self.game_count * GAME_RECORD.size > size or self._tags_offset > size:
+            self.close()
+            raise ValueError(f"{path} is truncated, its tables end past its {size} bytes")
+
+    def __len__(self) -> int:
+        return self.game_count
+
+    def close(self) -> None:
+        self._map.close()
+
+    def __enter__(self) -> "Archive":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _span(self, game: int) -> tuple[int, int]:
+        if not 0 <= game < self.game_count:
+            raise IndexError(f"Game {game} is not in {self.path}")
+        return INDEX_ENTRIES.unpack_from(self._map, self._index_offset + game * 8)
+
+    def ply_count(self, game: int) -> int:
+        start, end = self._span(game)
+        return (end - start) // 2
+
+    def moves(self, game: int) -> array:
+        start, end = self._span(game)
+        moves = array('H', self._map[start:end])
+        if sys.byteorder == "big":
+            moves.byteswap()
+        return moves
+
+    def move(self, game: int, ply: int) -> int:
+        start, end = self._span(game)
+        if not 0 <= ply < (end - start) // 2:
+            raise IndexError(f"Game {game} has no ply {ply}")
+        return struct.unpack_from("<H", self._map, start + ply * 2)[0]
+
+    def result(self, game: int) -> str:
+        self._span(game)
+        return RESULTS[self._map[self._games_offset + game * GAME_RECORD.size]]
+
+    def headers(self, game: int) -> dict[str, str]:
+        self._span(game)
+        _, offset, length = GAME_RECORD.unpack_from(self._map, self._games_offset + game * GAME_RECORD.size)
+        start = self._tags_offset + offset
+        text = self._map[start:start + length].decode()
+        return dict(line.split("\t", 1) for line in text.splitlines())
+
+    def start_fen(self, game: int) -> str:
+        return self.headers(game).get("FEN", STARTING_FEN)
+
+    def position(self, game: int, ply: int | None = None) -> Position:
+        """Position after the first ply moves of a game, after all of them by default"""
+        moves = self.moves(game)
+        position = Position(self.start_fen(game))
+        for move in moves[:len(moves) if ply is None else ply]:
+            position.make_move(move)
+        return position
+
+
+def import_pgn(pgn_path: str, archive_path: str) -> tuple[int, list[str]]:
+    """Convert a PGN file, skipping games with illegal moves"""
+    errors = []
+    count = 0
+    with ArchiveWriter(archive_path) as writer:
+        for index, game in enumerate(read_file(pgn_path)):
+            try:
+                writer.add_pgn(game)
+                count += 1
+            except ValueError as ex:
+                errors.append(f"game {index + 1}: {ex}")
+    return count, errors
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Binary game archive tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="convert a PGN file to an archive")
+    import_parser.add_argument("pgn")
+    import_parser.add_argument("archive")
+    show_parser = commands.add_parser("show", help="print a game or the position at a ply")
+    show_parser.add_argument("archive")
+    show_parser.add_argument("game", type=int)
+    show_parser.add_argument("--ply", type=int)
+    args = parser.parse_args()
+
+    if args.command == "import":
+        start_time = time.perf_counter()
+        imported, problems = import_pgn(args.pgn, args.archive)
+        for problem in problems:
+            print(problem)
+        print(f"{imported} games in {time.perf_counter() - start_time:.2f}s, "
+              f"{os.path.getsize(args.archive):,} bytes, {len(problems)} skipped")
+    else:
+        with Archive(args.archive) as archive:
+            if args.ply is not None:
+                print(archive.position(args.game, args.ply).fen())
+            else:
+                for tag, value in archive.headers(args.game).items():
+                    print(f'[{tag} "{value}"]')
+                replay = Position(archive.start_fen(args.game))
+                sans = []
+                for archived_move in archive.moves(args.game):
+                    sans.append(move_to_san(replay, archived_move))
+                    replay.make_move(archived_move)
+                print(" ".join(sans), archive.result(args.game))
@@ -0,0 +1,112 @@
+"""Attack tables built once at import.
+
+Every table is indexed by square (``y * 8 + x``, see :mod:`core.position`) and holds bitboards, so move
+generation and attack detection are lookups instead of walking direction tuples with bounds checks.
+"""
+
+KNIGHT_STEPS = ((-2, -1), (-2, 1), (2, -1), (2, 1), (-1, -2), (1, -2), (-1, 2), (1, 2))
+KING_STEPS = ((1, 1), (-1, 1), (1, -1), (-1, -1), (1, 0), (0, 1), (-1, 0), (0, -1))
+
+# Ray directions, the first four move towards higher square numbers
+EAST, SOUTH, SOUTH_EAST, SOUTH_WEST, WEST, NORTH, NORTH_WEST, NORTH_EAST = range(8)
+DIRECTION_STEPS = ((1, 0), (0, 1), (1, 1), (-1, 1), (-1, 0), (0, -1), (-1, -1), (1, -1))
+ROOK_DIRECTIONS = (EAST, SOUTH, WEST, NORTH)
+BISHOP_DIRECTIONS = (SOUTH_EAST, SOUTH_WEST, NORTH_WEST, NORTH_EAST)
+
+
+def _on_board(x: int, y: int) -> bool:
+    return 0 <= x < 8 and 0 <= y < 8
+
+
+def _step_attacks(steps) -> list[int]:
+    table = []
+    for sq in range(64):
+        x, y = sq & 7, sq >> 3
+        attacks = 0
+        for add_x, add_y in steps:
+            if _on_board(x + add_x, y + add_y):
+                attacks |= 1 << ((y + add_y) * 8 + x + add_x)
+        table.append(attacks)
+    return table
+
+
+def _rays() -> list[list[int]]:
+    table = []
+    for add_x, add_y in DIRECTION_STEPS:
+        rays = []
+        for sq in range(64):
+            x, y = (sq & 7) + add_x, (sq >> 3) + add_y
+            ray = 0
+            while _on_board(x, y):
+                ray |= 1 << (y * 8 + x)
+                x += add_x
+                y += add_y
+            rays.append(ray)
+        table.append(rays)
+    return table
+
+
+def _between() -> list[list[int]]:
+    table = [[0] * 64 for _ in range(64)]
+    for sq in range(64):
+        for add_x, add_y in DIRECTION_STEPS:
+            x, y = (sq & 7) + add_x, (sq >> 3) + add_y
+            squares = 0
+            while _on_board(x, y):
+                table[sq][y * 8 + x] = squares
+                squares |= 1 << (y * 8 + x)
+                x += add_x
+                y += add_y
+    return table
+
+
+def _pawn_tables(direction: int) -> tuple[list[int], list[int]]:
+    pushes, attacks = [], []
+    for sq in range(64):
+        x, y = sq & 7, (sq >> 3) + direction
+        push, attack = 0, 0
+        if 0 <= y < 8:
+            push = 1 << (y * 8 + x)
+            for new_x in (x - 1, x + 1):
+                if 0 <= new_x < 8:
+                    attack |= 1 << (y * 8 + new_x)
+        pushes.append(push)
+        attacks.append(attack)
+    return pushes, attacks
+
+
+KNIGHT_ATTACKS = _step_attacks(KNIGHT_STEPS)
+KING_ATTACKS = _step_attacks(KING_STEPS)
+RAYS = _rays()
+BETWEEN = _between()
+
+# Indexed by colour, white pawns move towards y = 0
+_WHITE_PAWN_TABLES = _pawn_tables(-1)
+_BLACK_PAWN_TABLES = _pawn_tables(1)
+PAWN_PUSHES = [_WHITE_PAWN_TABLES[0], _BLACK_PAWN_TABLES[0]]
+PAWN_ATTACKS = [_WHITE_PAWN_TABLES[1], _BLACK_PAWN_TABLES[1]]
+
+
+def _slider_attacks(sq: int, occupied: int, directions) -> int:
+    attacks = 0
+    for direction in directions:
+        ray = RAYS[direction][sq]
+        blockers = ray & occupied
+        if blockers:
+            # Nearest blocker is the lowest bit on rays towards higher squares and the highest bit otherwise
+            blocker = (blockers & -blockers).bit_length() - 1 if direction < WEST else blockers.bit_length() - 1
+            ray ^= RAYS[direction][blocker]
+        attacks |= ray
+    return attacks
+
+
+def rook_attacks(sq: int, occupied: int) -> int:
+    return _slider_attacks(sq, occupied, ROOK_DIRECTIONS)
+
+
+def bishop_attacks(sq: int, occupied: int) -> int:
+    return _slider_attacks(sq, occupied, BISHOP_DIRECTIONS)
+
+
+def queen_attacks(sq: int, occupied: int) -> int:
+    return _slider_attacks(sq, occupied, ROOK_DIRECTIONS) | _slider_attacks(sq, occupied, BISHOP_DIRECTIONS)
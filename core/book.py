@@ -0,0 +1,104 @@
+"""Polyglot opening books.
+
+A ``.bin`` book is a list of 16-byte big-endian entries (key, move, weight, learn) sorted by key, where
+the key is the Polyglot hash that ``Position.key`` already computes. The file is memory-mapped and
+searched in place, so opening even a large book costs nothing up front.
+"""
+import mmap
+import os
+import random
+import struct
+from typing import NamedTuple
+
+from core.move import NULL_MOVE, find_move, is_castle, move_from, move_to
+from core.position import Position, EMPTY, square
+
+ENTRY = struct.Struct(">QHHI")
+KEY = struct.Struct(">Q")
+
+
+class BookEntry(NamedTuple):
+    move: int
+    weight: int
+    learn: int
+
+
+def decode_polyglot_move(position: Position, raw: int, moves=None) -> int:
+    """Legal move of a Polyglot move, or NULL_MOVE when the position has no such move"""
+    # Polyglot counts rows from rank 1 and writes castling as the king taking its own rook
+    to_sq = square(raw & 7, 7 - (raw >> 3 & 7))
+    from_sq = square(raw >> 6 & 7, 7 - (raw >> 9 & 7))
+    promotion = raw >> 12 & 7
+    if moves is None:
+        moves = position.legal_moves()
+
+    for move in moves:
+        if is_castle(move) and move_from(move) == from_sq:
+            rook_sq = move_to(move) + 1 if move_to(move) > from_sq else move_to(move) - 2
+            if rook_sq == to_sq:
+                return move
+    return find_move(moves, from_sq, to_sq, promotion + 1 if promotion else EMPTY)
+
+
+class PolyglotBook:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) % ENTRY.size != 0:
+            self._map.close()
+            raise ValueError(f"{path} is {os.path.getsize(path)} bytes, "
+                             f"not a whole number of {ENTRY.size} byte entries")
+        self.size = len(self._map) // ENTRY.size
+
+    def __len__(self) -> int:
+        return self.size
+
+    def close(self) -> None:
+        self._map.close()
+
+    def __enter__(self) -> "PolyglotBook":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _first_index(self, key: int) -> int:
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if KEY.unpack_from(self._map, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def entries(self, key: int) -> list[BookEntry]:
+        result = []
+        for i in range(self._first_index(key), self.size):
+            entry_key, move, weight, learn = ENTRY.unpack_from(self._map, i * ENTRY.size)
+            if entry_key != key:
+                break
+            result.append(BookEntry(move, weight, learn))
+        return result
+
+    def moves(self, position: Position) -> list[tuple[int, int]]:
+        """(move, weight) of the book moves that are legal in the position"""
+        entries = self.entries(position.key)
+        if not entries:
+            return []
+
+        legal_moves = position.legal_moves()
+        result = []
+        for entry in entries:
+            move = decode_polyglot_move(position, entry.move, legal_moves)
+            if move != NULL_MOVE:
+                result.append((move, entry.weight))
+        return result
+
+    def choose(self, position: Position, rng: random.Random | None = None) -> int:
+        """Book move picked with probability proportional to its weight, or NULL_MOVE when out of book"""
+        moves = [(move, weight) for move, weight in self.moves(position) if weight > 0]
+        if not moves:
+            return NULL_MOVE
+        return (rng or random).choices([move for move, _ in moves], [weight for _, weight in moves])[0]
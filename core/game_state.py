@@ -0,0 +1,64 @@
+"""Board state codes, as shown by the game over dialog, and the rules that reach them from a Position."""
+from core.position import Position, WHITE
+
+NORMAL = 0
+CHECK = 1
+# Checkmate with white or black to move
+CHECKMATE_WHITE = 2
+CHECKMATE_BLACK = 3
+DRAW_OFFERED = 4
+STALEMATE = 5
+FIFTY_MOVES = 6
+REPETITION = 7
+INSUFFICIENT_MATERIAL = 8
+# Adjudicated from the endgame tablebases
+TABLEBASE_WHITE_WIN = 9
+TABLEBASE_BLACK_WIN = 10
+TABLEBASE_DRAW = 11
+
+
+def board_state(position: Position, tablebase=None) -> int:
+    is_no_possible_move = not position.has_legal_move()
+    if position.is_check():
+        state = CHECK
+        if is_no_possible_move:
+            state = CHECKMATE_WHITE if position.turn == WHITE else CHECKMATE_BLACK
+    else:
+        state = STALEMATE if is_no_possible_move else NORMAL
+
+    if position.is_insufficient_material():
+        state = INSUFFICIENT_MATERIAL
+
+    # The half move clock counts plies, fifty moves by each side are a hundred of them
+    if position.half_clock >= 100:
+        state = FIFTY_MOVES
+
+    if position.is_repetition(3):
+        state = REPETITION
+
+    if state <= CHECK and tablebase is not None:
+        state = tablebase_state(position, tablebase, state)
+
+    return state
+
+
+def tablebase_state(position: Position, tablebase, state: int = NORMAL) -> int:
+    """Result of a perfect game from here, wins the fifty move rule spoils count as draws"""
+    wdl = tablebase.probe_wdl(position)
+    if wdl is None:
+        return state
+    if abs(wdl) < 2:
+        return TABLEBASE_DRAW
+    return TABLEBASE_WHITE_WIN if (wdl > 0) == (position.turn == WHITE) else TABLEBASE_BLACK_WIN
+
+
+def expected_result(state: int) -> str | None:
+    """PGN result the rules force in this state, None when the game may go on or end either way"""
+    match state:
+        case 2:
+            return "0-1"
+        case 3:
+            return "1-0"
+        case 5 | 8:
+            return "1/2-1/2"
+    return None
@@ -0,0 +1,61 @@
+"""Move history of a game that can be seeked to any ply in bounded time.
+
+A copy of the position is kept every ``interval`` plies, so reaching a ply copies the checkpoint at or
+before it and replays fewer than ``interval`` moves, however long the game is.
+"""
+from array import array
+from typing import Iterable
+
+from core.position import Position, STARTING_FEN
+
+CHECKPOINT_INTERVAL = 16
+
+
+class GameHistory:
+    """Moves played from a start position, numbered in plies from start_ply"""
+
+    def __init__(self, fen: str = STARTING_FEN, moves: Iterable[int] = (), start_ply: int = 0,
+                 interval: int = CHECKPOINT_INTERVAL) -> None:
+        self.start_ply = start_ply
+        self.interval = interval
+        self.moves = array('H')
+        self._position = Position(fen)
+        self._checkpoints = [self._snapshot()]
+        for move in moves:
+            self.append(move)
+
+    @property
+    def last_ply(self) -> int:
+        return self.start_ply + len(self.moves)
+
+    def _snapshot(self) -> Position:
+        position = self._position.copy()
+        # Only the positions since the last capture or pawn move can come back
+        position.key_history = position.key_history[max(len(position.key_history) - position.half_clock, 0):]
+        position.move_stack = []
+        return position
+
+    def append(self, move: int) -> None:
+        self._position.make_move(move)
+        self.moves.append(move)
+        if len(self.moves) % self.interval == 0:
+            self._checkpoints.append(self._snapshot())
+
+    def truncate(self, ply: int) -> None:
+        """Forget the moves after ply"""
+        position = self.position_at(ply)
+        del self.moves[ply - self.start_ply:]
+        del self._checkpoints[len(self.moves) // self.interval + 1:]
+        self._position = position
+
+    def position_at(self, ply: int) -> Position:
+        """New position after the moves up to ply"""
+        if not self.start_ply <= ply <= self.last_ply:
+            raise IndexError(f"Ply {ply} is outside {self.start_ply}-{self.last_ply}")
+
+        index = ply - self.start_ply
+        checkpoint = index // self.interval
+        position = self._checkpoints[checkpoint].copy()
+        for move in self.moves[checkpoint * self.interval:index]:
+            position.make_move(move)
+        return position
@@ -0,0 +1,307 @@
+"""Magic bitboard attack lookup for rooks, bishops and queens.
+
+For every square the relevant blocker squares are multiplied by a magic number so that the top bits of
+the product index a table holding the attack set for that blocker pattern. The magics below were found
+by ``python -m core.magic --regenerate`` and verified against the ray tables in :mod:`core.attacks`; the
+attack tables are filled from them on import in a fraction of a second, and kept in
+``cache/magic_bitboards.npz`` to skip even that on later starts.
+
+The tables are stored as NumPy arrays and copied into plain lists on load, since indexing a list with a
+Python int is several times faster than indexing an array and needs no conversion back to Python ints.
+"""
+import argparse
+import logging
+import os
+import time
+import zipfile
+
+import numpy as np
+
+from core.attacks import RAYS, ROOK_DIRECTIONS, BISHOP_DIRECTIONS, WEST
+from core import attacks
+
+CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "cache", "magic_bitboards.npz")
+CACHE_VERSION = 1
+SEED = 27
+
+MASK_64 = (1 << 64) - 1
+
+ROOK_MAGICS = (
+    0x0900110040208000, 0x10c0400020001000, 0x2100102001004008, 0x0600084010200600,
+    0x2600200442003008, 0x4180020080010400, 0x1080800082000100, 0x02000608812c0041,
+    0x0000800020804000, 0x6030400050082000, 0x8006001582002040, 0x02c1002010000900,
+    0x2601802800800402, 0x0005000401000802, 0x88540048100a1401, 0x0842000210408401,
+    0x0020218000804000, 0x0040008020004080, 0x4000808010002001, 0x0005010008100020,
+    0x0000808004000800, 0x0910808004000200, 0x0020010100020004, 0x10000600010c4084,
+    0x0220400080008020, 0x4482200180400080, 0x0a00200100110040, 0x4310001100210008,
+    0x048a080080800400, 0xc808040080800200, 0x1000010080800200, 0x0900204200040081,
+    0x0000408001002100, 0x0b04804202002b02, 0x0004200045001103, 0x0030009182800801,
+    0x0100910005000801, 0x0014020080800400, 0x0218100104000802, 0x06000112a20000c4,
+    0x0008288040008000, 0x0400201000414004, 0x0600820010420020, 0x400021001001000d,
+    0x1080080005010010, 0x410a040002008080, 0x8082000401020008, 0x8028040880420021,
+    0x0080004000802080, 0x40022300804a0200, 0x8000402200108200, 0xe001801000080180,
+    0x0202000810204600, 0x0406001008040200, 0x2100125128100400, 0x2001208400410200,
+    0x0000488020120102, 0x20c0008020110041, 0x080810220042800a, 0x0021041000210089,
+    0x6007003004080003, 0x0005008400020801, 0x008422108510080c, 0x400002408a240302,
+)
+
+BISHOP_MAGICS = (
+    0x20052000821a0040, 0x0060020212002024, 0x4804240400410348, 0x0004040094802814,
+    0x4401114000041810, 0x0191012010000020, 0x0404010482200010, 0x0801040101011001,
+    0x1020c0140c841040, 0x400a054802140124, 0x4808090214011200, 0x0004044100200000,
+    0x5201020211021294, 0x00a0008220a00110, 0x0240608401084000, 0x0068030400c40400,
+    0x0008000411102200, 0x60080044810c1420, 0x0040400882020020, 0x020800c104110000,
+    0xa446050400a20801, 0x0005001205010100, 0x0281000884100202, 0x3022200100883400,
+    0x01c2089040080848, 0x0389084060080524, 0x0000300122040040, 0x6004040000410200,
+    0x0001020004008408, 0x8000810000806000, 0x0412408042180100, 0x2801002a40440432,
+    0x20100848802002c0, 0x8011101100020408, 0xd404002810040044, 0x0008600800390810,
+    0x0004040400081100, 0x0004010a00014806, 0x069e440040210800, 0x0c01004101808400,
+    0x0002102404082218, 0x5000821010200200, 0x0200108401041008, 0x2000108a44050800,
+    0x0080200410104100, 0x14c0100050801040, 0x005024010c050041, 0x2804484e40c00102,
+    0x0602020104400088, 0x00c0440404820121, 0x0088050401040000, 0x00000114208800a0,
+    0x4002032002048050, 0x0000080208320804, 0x04041004b1040020, 0x0812901102049001,
+    0x2020822110026000, 0x0000008041101080, 0x1472300d08880408, 0x0000000100208800,
+    0x0648805008030404, 0x0040080910254a08, 0x8c00882821180221, 0x0520200200802880,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def relevant_mask(sq: int, directions) -> int:
+    """Squares whose occupancy changes the slider's attacks, the last square of each ray never does"""
+    mask = 0
+    for direction in directions:
+        ray = RAYS[direction][sq]
+        if ray:
+            edge = (ray & -ray) if direction >= WEST else 1 << (ray.bit_length() - 1)
+            mask |= ray ^ edge
+    return mask
+
+
+def _subsets(mask: int) -> list[int]:
+    subsets = []
+    subset = 0
+    while True:
+        subsets.append(subset)
+        subset = (subset - mask) & mask
+        if subset == 0:
+            return subsets
+
+
+_TOP_BYTE_BITS = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _candidates(mask: int, rng: np.random.Generator, count: int = 4096) -> np.ndarray:
+    """Sparse random numbers, dropping those that leave the top byte of the mask product nearly empty"""
+    magics = np.bitwise_and.reduce(rng.integers(0, 1 << 64, size=(3, count), dtype=np.uint64))
+    top_byte = (magics * np.uint64(mask)) >> np.uint64(56)
+    return magics[_TOP_BYTE_BITS[top_byte] >= 6]
+
+
+def _find_magic(mask: int, occupancies: np.ndarray, references: np.ndarray, bits: int,
+                rng: np.random.Generator) -> tuple[int, np.ndarray]:
+    shift = np.uint64(64 - bits)
+    table = np.zeros(1 << bits, dtype=np.uint64)
+    # Most bad magics already collide on a handful of blocker patterns
+    sample = rng.permutation(len(occupancies))[:64]
+    sample_occupancies, sample_references = occupancies[sample], references[sample]
+
+    while True:
+        for magic in _candidates(mask, rng):
+            # A slot shared by blocker patterns with different attacks loses one of them when written
+            index = (sample_occupancies * magic) >> shift
+            table[index] = sample_references
+            if not np.array_equal(table[index], sample_references):
+                continue
+
+            index = (occupancies * magic) >> shift
+            table[index] = references
+            if np.array_equal(table[index], references):
+                table = np.zeros(1 << bits, dtype=np.uint64)
+                table[index] = references
+                return int(magic), table
+
+
+def generate(directions, reference, rng: np.random.Generator) -> dict[str, np.ndarray]:
+    masks, magics, shifts, offsets, tables = [], [], [], [], []
+    offset = 0
+    for sq in range(64):
+        mask = relevant_mask(sq, directions)
+        bits = mask.bit_count()
+        subsets = _subsets(mask)
+        occupancies = np.array(subsets, dtype=np.uint64)
+        references = np.array([reference(sq, subset) for subset in subsets], dtype=np.uint64)
+
+        magic, table = _find_magic(mask, occupancies, references, bits, rng)
+        masks.append(mask)
+        magics.append(magic)
+        shifts.append(64 - bits)
+        offsets.append(offset)
+        tables.append(table)
+        offset += len(table)
+
+    return {
+        "masks": np.array(masks, dtype=np.uint64),
+        "magics": np.array(magics, dtype=np.uint64),
+        "shifts": np.array(shifts, dtype=np.uint8),
+        "offsets": np.array(offsets, dtype=np.uint32),
+        "attacks": np.concatenate(tables),
+    }
+
+
+def fill_tables(directions, reference, magics) -> dict[str, np.ndarray]:
+    """Attack tables of known magics, raising ValueError when a magic maps different attacks to one slot"""
+    masks, shifts, offsets, tables = [], [], [], []
+    offset = 0
+    for sq in range(64):
+        mask = relevant_mask(sq, directions)
+        bits = mask.bit_count()
+        occupancies = np.array(_subsets(mask), dtype=np.uint64)
+        references = np.array([reference(sq, int(subset)) for subset in occupancies.tolist()], dtype=np.uint64)
+
+        index = (occupancies * np.uint64(magics[sq])) >> np.uint64(64 - bits)
+        table = np.zeros(1 << bits, dtype=np.uint64)
+        table[index] = references
+        if not np.array_equal(table[index], references):
+            raise ValueError(f"Magic {magics[sq]:#x} of square {sq} does not fit its blockers")
+
+        masks.append(mask)
+        shifts.append(64 - bits)
+        offsets.append(offset)
+        tables.append(table)
+        offset += len(table)
+
+    return {
+        "masks": np.array(masks, dtype=np.uint64),
+        "magics": np.array(magics, dtype=np.uint64),
+        "shifts": np.array(shifts, dtype=np.uint8),
+        "offsets": np.array(offsets, dtype=np.uint32),
+        "attacks": np.concatenate(tables),
+    }
+
+
+def verify(tables: dict[str, np.ndarray], directions, reference) -> bool:
+    """Check every blocker pattern of every square against the ray based reference attacks"""
+    for sq in range(64):
+        mask = int(tables["masks"][sq])
+        if mask != relevant_mask(sq, directions):
+            return False
+
+        subsets = _subsets(mask)
+        occupancies = np.array(subsets, dtype=np.uint64)
+        index = ((occupancies * tables["magics"][sq]) >> np.uint64(tables["shifts"][sq])) \
+            + np.uint64(tables["offsets"][sq])
+        references = np.array([reference(sq, subset) for subset in subsets], dtype=np.uint64)
+        if np.any(tables["attacks"][index.astype(np.int64)] != references):
+            return False
+    return True
+
+
+def build_tables() -> dict[str, dict[str, np.ndarray]]:
+    return {
+        "rook": fill_tables(ROOK_DIRECTIONS, attacks.rook_attacks, ROOK_MAGICS),
+        "bishop": fill_tables(BISHOP_DIRECTIONS, attacks.bishop_attacks, BISHOP_MAGICS),
+    }
+
+
+def search_tables() -> dict[str, dict[str, np.ndarray]]:
+    """New magics found from scratch, which takes a while"""
+    rng = np.random.default_rng(SEED)
+    return {
+        "rook": generate(ROOK_DIRECTIONS, attacks.rook_attacks, rng),
+        "bishop": generate(BISHOP_DIRECTIONS, attacks.bishop_attacks, rng),
+    }
+
+
+def save_tables(tables: dict[str, dict[str, np.ndarray]], path: str = CACHE_FILE) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    arrays = {f"{piece}_{name}": array for piece, table in tables.items() for name, array in table.items()}
+    with open(path, "wb") as f:
+        np.savez(f, version=np.array(CACHE_VERSION), **arrays)
+
+
+def load_tables(path: str = CACHE_FILE) -> dict[str, dict[str, np.ndarray]]:
+    with np.load(path) as data:
+        if int(data["version"]) != CACHE_VERSION:
+            raise ValueError(f"Magic cache version {int(data['version'])} is not {CACHE_VERSION}")
+
+        return {piece: {name: data[f"{piece}_{name}"] for name in ("masks", "magics", "shifts", "offsets", "attacks")}
+                for piece in ("rook", "bishop")}
+
+
+def _load_or_build() -> dict[str, dict[str, np.ndarray]]:
+    try:
+        tables = load_tables()
+        if tables["rook"]["magics"].tolist() == list(ROOK_MAGICS) \
+                and tables["bishop"]["magics"].tolist() == list(BISHOP_MAGICS):
+            return tables
+        logger.info("Magic cache holds other magics")
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as ex:
+        logger.info(f"Building magic bitboards: {ex}")
+
+    tables = build_tables()
+    try:
+        save_tables(tables)
+    except OSError as ex:
+        logger.warning(f"Cannot cache magic bitboards: {ex}")
+    return tables
+
+
+_tables = _load_or_build()
+
+_ROOK_MASKS = _tables["rook"]["masks"].tolist()
+_ROOK_MAGICS = _tables["rook"]["magics"].tolist()
+_ROOK_SHIFTS = _tables["rook"]["shifts"].tolist()
+_ROOK_OFFSETS = _tables["rook"]["offsets"].tolist()
+_ROOK_ATTACKS = _tables["rook"]["attacks"].tolist()
+
+_BISHOP_MASKS = _tables["bishop"]["masks"].tolist()
+_BISHOP_MAGICS = _tables["bishop"]["magics"].tolist()
+_BISHOP_SHIFTS = _tables["bishop"]["shifts"].tolist()
+_BISHOP_OFFSETS = _tables["bishop"]["offsets"].tolist()
+_BISHOP_ATTACKS = _tables["bishop"]["attacks"].tolist()
+
+
+def rook_attacks(sq: int, occupied: int) -> int:
+    return _ROOK_ATTACKS[_ROOK_OFFSETS[sq]
+                         + (((occupied & _ROOK_MASKS[sq]) * _ROOK_MAGICS[sq] & MASK_64) >> _ROOK_SHIFTS[sq])]
+
+
+def bishop_attacks(sq: int, occupied: int) -> int:
+    return _BISHOP_ATTACKS[_BISHOP_OFFSETS[sq]
+                           + (((occupied & _BISHOP_MASKS[sq]) * _BISHOP_MAGICS[sq] & MASK_64) >> _BISHOP_SHIFTS[sq])]
+
+
+def queen_attacks(sq: int, occupied: int) -> int:
+    return rook_attacks(sq, occupied) | bishop_attacks(sq, occupied)
+
+
+def magics_source(tables: dict[str, dict[str, np.ndarray]]) -> str:
+    """The ROOK_MAGICS and BISHOP_MAGICS constants of the tables, to be pasted above"""
+    source = []
+    for piece in ("rook", "bishop"):
+        magics = tables[piece]["magics"].tolist()
+        source.append(f"{piece.upper()}_MAGICS = (")
+        source += ["    " + " ".join(f"0x{magic:016x}," for magic in magics[i:i + 4]) for i in range(0, 64, 4)]
+        source += [")", ""]
+    return "\n".join(source[:-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build and verify the magic bitboards, or search new magics")
+    parser.add_argument("--regenerate", action="store_true", help="search new magics and print them as constants")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    result = search_tables() if args.regenerate else build_tables()
+    print(f"Built in {time.perf_counter() - start:.2f}s")
+
+    is_valid = verify(result["rook"], ROOK_DIRECTIONS, attacks.rook_attacks) \
+        and verify(result["bishop"], BISHOP_DIRECTIONS, attacks.bishop_attacks)
+    print("Magics verified" if is_valid else "Magics FAILED verification")
+
+    if args.regenerate and is_valid:
+        print(magics_source(result))
+    elif is_valid:
+        save_tables(result)
+        print(f"Saved to {os.path.abspath(CACHE_FILE)}")
@@ -0,0 +1,80 @@
+"""16-bit move encoding.
+
+Bits 0-5 hold the from square, bits 6-11 the to square and bits 12-15 the flags below, so moves are
+plain ints and a move list fits in an ``array('H')``. Every capture, en passant included, has the
+``CAPTURE`` bit set and promotions carry the promoted piece in their two low flag bits.
+"""
+QUIET = 0
+DOUBLE_PUSH = 1
+KING_CASTLE = 2
+QUEEN_CASTLE = 3
+CAPTURE = 4
+EN_PASSANT = 5
+PROMOTION = 8
+PROMOTION_CAPTURE = 12
+
+# Flag value shifted in place, for building moves without a function call in the generator
+CAPTURE_BITS = CAPTURE << 12
+DOUBLE_PUSH_BITS = DOUBLE_PUSH << 12
+EN_PASSANT_BITS = EN_PASSANT << 12
+
+NULL_MOVE = 0
+
+# Piece type of core.position that the promotion flag bits count from
+_KNIGHT = 2
+
+
+def encode_move(from_sq: int, to_sq: int, flags: int = QUIET) -> int:
+    return from_sq | to_sq << 6 | flags << 12
+
+
+def promotion_flags(piece_type: int, capture: bool = False) -> int:
+    return (PROMOTION_CAPTURE if capture else PROMOTION) | (piece_type - _KNIGHT)
+
+
+def move_from(move: int) -> int:
+    return move & 63
+
+
+def move_to(move: int) -> int:
+    return move >> 6 & 63
+
+
+def move_flags(move: int) -> int:
+    return move >> 12
+
+
+def move_promotion(move: int) -> int:
+    """Promoted piece type, or 0 (EMPTY) for other moves"""
+    return _KNIGHT + (move >> 12 & 3) if move >> 12 & PROMOTION else 0
+
+
+def is_capture(move: int) -> bool:
+    return bool(move >> 12 & CAPTURE)
+
+
+def is_castle(move: int) -> bool:
+    return move >> 12 in (KING_CASTLE, QUEEN_CASTLE)
+
+
+def changed_squares(move: int) -> tuple[int, ...]:
+    """Squares whose contents the move changes"""
+    from_sq, to_sq, flags = move & 63, move >> 6 & 63, move >> 12
+    match flags:
+        case 2:
+            return from_sq, to_sq, to_sq + 1, to_sq - 1
+        case 3:
+            return from_sq, to_sq, to_sq - 2, to_sq + 1
+        case 5:
+            # The captured pawn stands on the to file of the from rank
+            return from_sq, to_sq, from_sq & ~7 | to_sq & 7
+    return from_sq, to_sq
+
+
+def find_move(moves, from_sq: int, to_sq: int, promotion: int = 0) -> int:
+    """The move of ``moves`` from from_sq to to_sq with the given promotion, or NULL_MOVE"""
+    squares = from_sq | to_sq << 6
+    for move in moves:
+        if move & 4095 == squares and move_promotion(move) == promotion:
+            return move
+    return NULL_MOVE
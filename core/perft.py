@@ -0,0 +1,157 @@
+"""Perft: count the leaf nodes of the legal move tree to validate and time move generation.
+
+Run ``python -m core.perft --suite`` for the regression suite, ``--fen ... --depth N --divide`` for a
+per-move breakdown and add ``--stockfish`` to cross-check every count with the engine's ``go perft``.
+"""
+import argparse
+import platform
+import subprocess
+import time
+
+from core.position import Position, STARTING_FEN, move_to_uci
+
+DEFAULT_STOCKFISH = "stockfish/windows/stockfish.exe" if platform.system() == "Windows" \
+    else "stockfish/linux/stockfish"
+
+# (name, fen, {depth: nodes}) from the Chess Programming Wiki and the TalkChess perft collection
+SUITE = [
+    ("Start position", STARTING_FEN,
+     {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}),
+    ("Kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     {1: 48, 2: 2039, 3: 97862, 4: 4085603}),
+    ("Position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    ("Position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ("Position 4 mirrored", "r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1",
+     {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ("Position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     {1: 44, 2: 1486, 3: 62379, 4: 2103487}),
+    ("Position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     {1: 46, 2: 2079, 3: 89890, 4: 3894594}),
+    ("Illegal en passant, pinned on diagonal", "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1",
+     {1: 15, 2: 126, 3: 1928, 4: 13931, 5: 206379, 6: 1440467}),
+    ("Illegal en passant, pinned on rank", "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1",
+     {1: 18, 2: 92, 3: 1670, 4: 10138, 5: 185429, 6: 1134888}),
+    ("En passant gives check", "8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1",
+     {1: 13, 2: 102, 3: 1266, 4: 10276, 5: 135655, 6: 1015133}),
+    ("En passant out of check", "8/5bk1/8/2Pp4/8/1K6/8/8 w - d6 0 1",
+     {1: 8, 2: 104, 3: 736, 4: 9287, 5: 62297, 6: 824064}),
+    ("Promotions", "n1n5/PPPk4/8/8/8/8/4Kppp/5N1N b - - 0 1",
+     {1: 24, 2: 496, 3: 9483, 4: 182838}),
+    ("Underpromotion to avoid stalemate", "8/P1k5/K7/8/8/8/8/8 w - - 0 1",
+     {1: 6, 2: 27, 3: 273, 4: 1329, 5: 18135, 6: 92683}),
+    ("Promotion gives check", "4k3/1P6/8/8/8/8/K7/8 w - - 0 1",
+     {1: 9, 2: 40, 3: 472, 4: 2661, 5: 38983, 6: 217342}),
+]
+
+
+def perft(position: Position, depth: int) -> int:
+    moves = position.legal_moves()
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+
+    nodes = 0
+    for move in moves:
+        undo = position.make_move(move)
+        nodes += perft(position, depth - 1)
+        position.unmake_move(move, undo)
+    return nodes
+
+
+def divide(position: Position, depth: int) -> dict[str, int]:
+    """Perft of depth - 1 below every legal move, keyed by UCI notation"""
+    result = {}
+    for move in position.legal_moves():
+        undo = position.make_move(move)
+        result[move_to_uci(move)] = perft(position, depth - 1)
+        position.unmake_move(move, undo)
+    return result
+
+
+def stockfish_divide(path: str, fen: str, depth: int) -> dict[str, int]:
+    """Per-move node counts reported by the Stockfish binary's ``go perft``"""
+    process = subprocess.Popen([path], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    try:
+        process.stdin.write(f"uci\nposition fen {fen}\ngo perft {depth}\n")
+        process.stdin.flush()
+
+        result = {}
+        for line in process.stdout:
+            line = line.strip()
+            if line.startswith("Nodes searched"):
+                break
+
+            move, separator, nodes = line.partition(": ")
+            if separator and nodes.isdigit():
+                result[move] = int(nodes)
+        return result
+    finally:
+        process.kill()
+        process.wait()
+
+
+def compare_with_stockfish(path: str, fen: str, depth: int, result: dict[str, int]) -> list[str]:
+    """Moves whose count differs from Stockfish, with both counts"""
+    expected = stockfish_divide(path, fen, depth)
+    return [f"{move}: {result.get(move)} != {expected.get(move)}"
+            for move in sorted(set(result) | set(expected)) if result.get(move) != expected.get(move)]
+
+
+def run(fen: str, depth: int, expected: int | None = None, show_divide=False, stockfish: str | None = None,
+        name: str = "") -> bool:
+    position = Position(fen)
+
+    start = time.perf_counter()
+    result = divide(position, depth)
+    elapsed = time.perf_counter() - start
+    nodes = sum(result.values()) if depth > 0 else 1
+
+    if show_divide:
+        for move, count in sorted(result.items()):
+            print(f"{move}: {count}")
+
+    is_valid = expected is None or nodes == expected
+    status = "" if expected is None else (" ok" if is_valid else f" FAILED, expected {expected}")
+    print(f"{name or fen} depth {depth}: {nodes} nodes in {elapsed:.3f}s "
+          f"({nodes / max(elapsed, 1e-9):,.0f} nps){status}")
+
+    if stockfish is not None:
+        mismatches = compare_with_stockfish(stockfish, fen, depth, result)
+        for mismatch in mismatches:
+            print(f"  stockfish mismatch {mismatch}")
+        is_valid = is_valid and len(mismatches) == 0
+
+    return is_valid
+
+
+def run_suite(max_depth: int, stockfish: str | None = None) -> bool:
+    is_valid = True
+    total_nodes = 0
+    start = time.perf_counter()
+    for name, fen, counts in SUITE:
+        depth = max(depth for depth in counts if depth <= max_depth)
+        is_valid = run(fen, depth, counts[depth], stockfish=stockfish, name=name) and is_valid
+        total_nodes += counts[depth]
+
+    elapsed = time.perf_counter() - start
+    print(f"Suite {'passed' if is_valid else 'FAILED'}: {total_nodes} nodes in {elapsed:.2f}s "
+          f"({total_nodes / elapsed:,.0f} nps)")
+    return is_valid
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Perft and divide over the Position rules")
+    parser.add_argument("--fen", default=STARTING_FEN)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--divide", action="store_true", help="print the node count below every root move")
+    parser.add_argument("--suite", action="store_true", help="run the standard perft positions up to --depth")
+    parser.add_argument("--stockfish", nargs="?", const=DEFAULT_STOCKFISH,
+                        help="cross-check against Stockfish's go perft (default: bundled binary)")
+    args = parser.parse_args()
+
+    if args.suite:
+        passed = run_suite(args.depth, args.stockfish)
+    else:
+        passed = run(args.fen, args.depth, show_divide=args.divide, stockfish=args.stockfish)
+    raise SystemExit(0 if passed else 1)
@@ -0,0 +1,87 @@
+"""Streaming PGN reader.
+
+``read_games`` walks a PGN stream line by line and yields one game at a time, so a multi-gigabyte
+archive is imported in constant memory. Comments, variations, NAGs and move numbers are skipped.
+"""
+import re
+from typing import NamedTuple, Iterator, TextIO
+
+from core.position import Position, STARTING_FEN
+from core.san import parse_san
+
+HEADER_PATTERN = re.compile(r'^\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+TOKEN_PATTERN = re.compile(r'1-0|0-1|1/2-1/2|\*|\d+\.+|\$\d+|[{}();]|[^\s{}();]+')
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+
+class PgnGame(NamedTuple):
+    headers: dict[str, str]
+    moves: list[str]
+    result: str
+
+    @property
+    def fen(self) -> str:
+        return self.headers.get("FEN", STARTING_FEN)
+
+    def replay(self) -> Iterator[tuple[Position, int]]:
+        """Every move in turn, with the position before it, which is updated in place"""
+        position = Position(self.fen)
+        for san in self.moves:
+            move = parse_san(position, san)
+            yield position, move
+            position.make_move(move)
+
+
+def read_games(stream: TextIO) -> Iterator[PgnGame]:
+    headers: dict[str, str] = {}
+    moves: list[str] = []
+    in_comment = False
+    depth = 0
+
+    for line in stream:
+        if not in_comment and depth == 0:
+            if line.startswith("%"):
+                continue
+
+            header = HEADER_PATTERN.match(line.lstrip())
+            if header is not None:
+                # Games without a result marker end at the next header section
+                if moves:
+                    yield PgnGame(headers, moves, headers.get("Result", "*"))
+                    headers, moves = {}, []
+                headers[header[1]] = header[2].replace('\\"', '"').replace("\\\\", "\\")
+                continue
+
+        for token in TOKEN_PATTERN.findall(line):
+            if in_comment:
+                in_comment = token != "}"
+                continue
+
+            match token:
+                case "{":
+                    in_comment = True
+                case ";":
+                    break
+                case "(":
+                    depth += 1
+                case ")":
+                    depth = max(depth - 1, 0)
+                case _ if depth > 0 or token[0] == "$" or token[0].isdigit() and token[-1] == ".":
+                    pass
+                case _ if token in RESULTS:
+                    yield PgnGame(headers, moves, token)
+                    headers, moves = {}, []
+                case _:
+                    moves.append(token)
+
+    if moves or headers:
+        yield PgnGame(headers, moves, headers.get("Result", "*"))
+
+
+def open_pgn(path: str) -> TextIO:
+    return open(path, encoding="utf-8-sig", errors="replace")
+
+
+def read_file(path: str) -> Iterator[PgnGame]:
+    with open_pgn(path) as stream:
+        yield from read_games(stream)
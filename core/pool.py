@@ -0,0 +1,26 @@
+"""Process pool shared by the batch tools (validation, rendering)."""
+import concurrent.futures
+from typing import Any, Callable, Iterable, Iterator
+
+# Tasks submitted per worker before waiting for one to finish
+IN_FLIGHT_PER_WORKER = 2
+
+
+def imap_unordered(tasks: Iterable[tuple], workers: int, initializer: Callable | None = None,
+                   initargs: tuple = ()) -> Iterator[Any]:
+    """Results of (function, *args) tasks run on a process pool, in the order they finish.
+
+    Only a few tasks per worker are in flight, so a lazy task stream (games read from a large PGN) is never
+    read far ahead of the workers.
+    """
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=initializer,
+                                                initargs=initargs) as executor:
+        pending = set()
+        for function, *args in tasks:
+            if len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(executor.submit(function, *args))
+        for future in concurrent.futures.as_completed(pending):
+            yield future.result()
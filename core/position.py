@@ -0,0 +1,625 @@
+from array import array
+from typing import NamedTuple
+
+from core.attacks import KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, PAWN_PUSHES, BETWEEN
+from core.magic import rook_attacks, bishop_attacks, queen_attacks
+from core.move import KING_CASTLE, QUEEN_CASTLE, PROMOTION, NULL_MOVE, CAPTURE_BITS, DOUBLE_PUSH_BITS, \
+    EN_PASSANT_BITS, move_promotion, promotion_flags, find_move
+from core.zobrist import PIECE_KEYS, CASTLING_KEYS, EN_PASSANT_KEYS, WHITE_TURN_KEY
+
+STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+WHITE = 0
+BLACK = 1
+
+EMPTY = 0
+PAWN = 1
+KNIGHT = 2
+BISHOP = 3
+ROOK = 4
+QUEEN = 5
+KING = 6
+
+PIECE_SYMBOLS = " pnbrqk"
+PIECE_VALUES = (0, 1, 3, 3, 5, 9, 0)
+
+WHITE_KING_SIDE = 1
+WHITE_QUEEN_SIDE = 2
+BLACK_KING_SIDE = 4
+BLACK_QUEEN_SIDE = 8
+
+FILES = "abcdefgh"
+RANKS = "87654321"
+
+ALL_SQUARES = (1 << 64) - 1
+
+# FEN without the move clocks, by Zobrist key, shared by every position in the process
+FEN_CACHE_SIZE = 1 << 16
+_fen_cache: dict[int, str] = {}
+
+# Castling rights kept after a piece moves from or to a square
+CASTLING_MASK = array('b', [15] * 64)
+CASTLING_MASK[0] = 15 & ~BLACK_QUEEN_SIDE
+CASTLING_MASK[4] = 15 & ~(BLACK_KING_SIDE | BLACK_QUEEN_SIDE)
+CASTLING_MASK[7] = 15 & ~BLACK_KING_SIDE
+CASTLING_MASK[56] = 15 & ~WHITE_QUEEN_SIDE
+CASTLING_MASK[60] = 15 & ~(WHITE_KING_SIDE | WHITE_QUEEN_SIDE)
+CASTLING_MASK[63] = 15 & ~WHITE_KING_SIDE
+
+
+def square(x: int, y: int) -> int:
+    """Square index of board coordinate (x, y), a8 is 0 and h1 is 63"""
+    return y * 8 + x
+
+
+def square_x(sq: int) -> int:
+    return sq & 7
+
+
+def square_y(sq: int) -> int:
+    return sq >> 3
+
+
+def square_name(sq: int) -> str:
+    return FILES[sq & 7] + RANKS[sq >> 3]
+
+
+def parse_square(name: str) -> int:
+    return square(FILES.index(name[0]), RANKS.index(name[1]))
+
+
+def move_to_uci(move: int) -> str:
+    promotion = move_promotion(move)
+    return square_name(move & 63) + square_name(move >> 6 & 63) \
+        + (PIECE_SYMBOLS[promotion] if promotion != EMPTY else "")
+
+
+def parse_uci(notation: str) -> tuple[int, int, int]:
+    """(from_square, to_square, promotion) of a UCI move, see Position.parse_uci for the encoded move"""
+    promotion = PIECE_SYMBOLS.index(notation[4].lower()) if len(notation) == 5 else EMPTY
+    return parse_square(notation[:2]), parse_square(notation[2:4]), promotion
+
+
+class Undo(NamedTuple):
+    """State that make_move cannot recompute when taking a move back"""
+    captured: int
+    castling: int
+    ep_square: int
+    half_clock: int
+    key: int
+
+
+class Position:
+    """Pygame-free chess position.
+
+    ``board`` holds one signed piece code per square (positive for white, negative for black) and
+    ``bitboards[colour][piece_type]`` mirrors it with one bit per square. Moves are 16-bit ints (see
+    :mod:`core.move`) and ``legal_moves`` returns them in an ``array('H')``.
+
+    ``make_move`` returns an :class:`Undo` record that ``unmake_move`` uses to restore the position in
+    place, ``push``/``pop`` keep those records on ``move_stack``.
+
+    ``key`` is the Zobrist key of the position (see :mod:`core.zobrist`), updated with every change and
+    ``key_history`` holds the keys of the positions reached before it.
+
+    The bitboards double as piece lists, and ``kings`` and ``material`` are kept up to date by every
+    piece placement, so nothing needs to scan the board to find pieces or count them.
+    """
+
+    def __init__(self, fen: str = STARTING_FEN) -> None:
+        self.board = array('b', bytes(64))
+        self.bitboards = [[0] * 7, [0] * 7]
+        self.occupied = [0, 0]
+        self.kings = [-1, -1]
+        self.material = [0, 0]
+        self.turn = WHITE
+        self.castling = 0
+        self.ep_square = -1
+        self.half_clock = 0
+        self.fullmove = 1
+        self.key = 0
+        self.key_history: list[int] = []
+        self.move_stack: list[tuple[int, Undo]] = []
+
+        self.set_fen(fen)
+
+    def copy(self) -> "Position":
+        position = Position.__new__(Position)
+        position.board = array('b', self.board)
+        position.bitboards = [self.bitboards[WHITE][:], self.bitboards[BLACK][:]]
+        position.occupied = self.occupied[:]
+        position.kings = self.kings[:]
+        position.material = self.material[:]
+        position.turn = self.turn
+        position.castling = self.castling
+        position.ep_square = self.ep_square
+        position.half_clock = self.half_clock
+        position.fullmove = self.fullmove
+        position.key = self.key
+        position.key_history = self.key_history[:]
+        position.move_stack = self.move_stack[:]
+        return position
+
+    def clear(self) -> None:
+        self.board = array('b', bytes(64))
+        self.bitboards = [[0] * 7, [0] * 7]
+        self.occupied = [0, 0]
+        self.kings = [-1, -1]
+        self.material = [0, 0]
+        self.key = 0
+        self.key_history = []
+        self.move_stack = []
+
+    def _put(self, sq: int, code: int) -> None:
+        colour = WHITE if code > 0 else BLACK
+        piece_type = abs(code)
+        bit = 1 << sq
+        self.board[sq] = code
+        self.bitboards[colour][piece_type] |= bit
+        self.occupied[colour] |= bit
+        self.material[colour] += PIECE_VALUES[piece_type]
+        self.key ^= PIECE_KEYS[colour][piece_type][sq]
+        if piece_type == KING:
+            self.kings[colour] = sq
+
+    def _remove(self, sq: int) -> int:
+        code = self.board[sq]
+        colour = WHITE if code > 0 else BLACK
+        piece_type = abs(code)
+        bit = ~(1 << sq)
+        self.board[sq] = EMPTY
+        self.bitboards[colour][piece_type] &= bit
+        self.occupied[colour] &= bit
+        self.material[colour] -= PIECE_VALUES[piece_type]
+        self.key ^= PIECE_KEYS[colour][piece_type][sq]
+        return code
+
+    def piece_at(self, sq: int) -> int:
+        return self.board[sq]
+
+    def piece_count(self, colour: int, piece_type: int) -> int:
+        return self.bitboards[colour][piece_type].bit_count()
+
+    def set_fen(self, fen: str) -> None:
+        items = fen.split()
+        self.clear()
+
+        for y, row in enumerate(items[0].split("/")[:8]):
+            x = 0
+            for char in row:
+                if x > 7:
+                    break
+
+                if char.isnumeric():
+                    x += int(char)
+                    continue
+
+                piece_type = PIECE_SYMBOLS.find(char.lower())
+                if piece_type <= 0:
+                    raise ValueError(f"Invalid FEN piece: {char}")
+                self._put(square(x, y), piece_type if char.isupper() else -piece_type)
+                x += 1
+
+        self.turn = WHITE if len(items) < 2 or items[1].lower() == "w" else BLACK
+
+        self.castling = 0
+        for char in items[2] if len(items) > 2 else "-":
+            match char:
+                case "K":
+                    self.castling |= WHITE_KING_SIDE
+                case "Q":
+                    self.castling |= WHITE_QUEEN_SIDE
+                case "k":
+                    self.castling |= BLACK_KING_SIDE
+                case "q":
+                    self.castling |= BLACK_QUEEN_SIDE
+
+        self.ep_square = -1
+        if len(items) > 3 and items[3] != "-":
+            ep_square = parse_square(items[3])
+            if self._can_capture_en_passant(ep_square):
+                self.ep_square = ep_square
+
+        self.half_clock = int(items[4]) if len(items) > 4 else 0
+        self.fullmove = int(items[5]) if len(items) > 5 else 1
+        self.key = self.compute_key()
+
+    def compute_key(self) -> int:
+        """Zobrist key computed from scratch, make_move keeps ``key`` equal to it incrementally"""
+        key = CASTLING_KEYS[self.castling]
+        for sq, code in enumerate(self.board):
+            if code != EMPTY:
+                key ^= PIECE_KEYS[WHITE if code > 0 else BLACK][abs(code)][sq]
+        if self.ep_square >= 0:
+            key ^= EN_PASSANT_KEYS[square_x(self.ep_square)]
+        if self.turn == WHITE:
+            key ^= WHITE_TURN_KEY
+        return key
+
+    def fen(self) -> str:
+        prefix = _fen_cache.get(self.key)
+        if prefix is None:
+            if len(_fen_cache) >= FEN_CACHE_SIZE:
+                _fen_cache.clear()
+            prefix = _fen_cache[self.key] = self._fen_prefix()
+        return f"{prefix} {self.half_clock} {self.fullmove}"
+
+    def _fen_prefix(self) -> str:
+        """Placement, turn, castling and en passant fields, which the Zobrist key determines"""
+        rows = []
+        for y in range(8):
+            row = ""
+            empty = 0
+            for x in range(8):
+                code = self.board[square(x, y)]
+                if code == EMPTY:
+                    empty += 1
+                    continue
+
+                if empty > 0:
+                    row += str(empty)
+                empty = 0
+                symbol = PIECE_SYMBOLS[abs(code)]
+                row += symbol.upper() if code > 0 else symbol
+
+            if empty > 0:
+                row += str(empty)
+            rows.append(row)
+
+        castling = ""
+        for right, symbol in ((WHITE_KING_SIDE, "K"), (WHITE_QUEEN_SIDE, "Q"),
+                              (BLACK_KING_SIDE, "k"), (BLACK_QUEEN_SIDE, "q")):
+            if self.castling & right:
+                castling += symbol
+
+        ep_square = square_name(self.ep_square) if self.ep_square >= 0 else "-"
+        turn = "w" if self.turn == WHITE else "b"
+        return f"{'/'.join(rows)} {turn} {castling or '-'} {ep_square}"
+
+    def _can_capture_en_passant(self, ep_square: int) -> bool:
+        """Whether a pawn of the side to move stands next to the pawn that just skipped ep_square"""
+        x, y = square_x(ep_square), square_y(ep_square)
+        pawn_y, pawn = (y + 1, PAWN) if self.turn == WHITE else (y - 1, -PAWN)
+        if not 0 <= pawn_y < 8:
+            return False
+
+        return (x > 0 and self.board[square(x - 1, pawn_y)] == pawn) or \
+            (x < 7 and self.board[square(x + 1, pawn_y)] == pawn)
+
+    def is_attacked(self, sq: int, by: int, occupied: int = -1) -> bool:
+        bitboards = self.bitboards[by]
+        if occupied < 0:
+            occupied = self.occupied[WHITE] | self.occupied[BLACK]
+
+        # A pawn attacks sq exactly when a pawn of the other colour on sq would attack it back
+        return bool(PAWN_ATTACKS[by ^ 1][sq] & bitboards[PAWN]
+                    or KNIGHT_ATTACKS[sq] & bitboards[KNIGHT]
+                    or KING_ATTACKS[sq] & bitboards[KING]
+                    or rook_attacks(sq, occupied) & (bitboards[ROOK] | bitboards[QUEEN])
+                    or bishop_attacks(sq, occupied) & (bitboards[BISHOP] | bitboards[QUEEN]))
+
+    def is_check(self) -> bool:
+        return self.is_attacked(self.kings[self.turn], self.turn ^ 1)
+
+    def _checks_and_pins(self) -> tuple[int, int, dict[int, int]]:
+        """Checking pieces, the squares that resolve a single check and the ray each pinned piece may move on"""
+        us, them = self.turn, self.turn ^ 1
+        theirs = self.bitboards[them]
+        king_sq = self.kings[us]
+        occupied = self.occupied[us] | self.occupied[them]
+
+        checkers = PAWN_ATTACKS[us][king_sq] & theirs[PAWN] | KNIGHT_ATTACKS[king_sq] & theirs[KNIGHT]
+        check_mask = checkers
+        pins = {}
+
+        # Sliders that would attack the king if only their own side's pieces blocked
+        snipers = rook_attacks(king_sq, self.occupied[them]) & (theirs[ROOK] | theirs[QUEEN]) \
+            | bishop_attacks(king_sq, self.occupied[them]) & (theirs[BISHOP] | theirs[QUEEN])
+        while snipers:
+            sniper = snipers & -snipers
+            snipers ^= sniper
+            ray = BETWEEN[king_sq][sniper.bit_length() - 1]
+            blockers = ray & occupied
+            if blockers == 0:
+                checkers |= sniper
+                check_mask |= ray | sniper
+            elif blockers & (blockers - 1) == 0 and blockers & self.occupied[us]:
+                pins[blockers.bit_length() - 1] = ray | sniper
+
+        return checkers, check_mask if checkers else ALL_SQUARES, pins
+
+    def legal_moves(self) -> array:
+        us = self.turn
+        ours = self.bitboards[us]
+        theirs = self.occupied[us ^ 1]
+        occupied = self.occupied[us] | theirs
+        checkers, check_mask, pins = self._checks_and_pins()
+        moves = array('H')
+
+        self._generate_king_moves(moves)
+        if checkers & (checkers - 1):
+            return moves
+        if checkers == 0:
+            self._generate_castling(moves)
+
+        self._generate_pawn_moves(moves, check_mask, pins)
+
+        not_ours = ~self.occupied[us]
+        for piece_type in (KNIGHT, BISHOP, ROOK, QUEEN):
+            pieces = ours[piece_type]
+            while pieces:
+                from_sq = (pieces & -pieces).bit_length() - 1
+                pieces &= pieces - 1
+
+                match piece_type:
+                    case 2:
+                        targets = KNIGHT_ATTACKS[from_sq]
+                    case 3:
+                        targets = bishop_attacks(from_sq, occupied)
+                    case 4:
+                        targets = rook_attacks(from_sq, occupied)
+                    case _:
+                        targets = queen_attacks(from_sq, occupied)
+
+                targets &= not_ours & check_mask
+                if from_sq in pins:
+                    targets &= pins[from_sq]
+                captures = targets & theirs
+                targets ^= captures
+                while captures:
+                    to_sq = (captures & -captures).bit_length() - 1
+                    captures &= captures - 1
+                    moves.append(from_sq | to_sq << 6 | CAPTURE_BITS)
+                while targets:
+                    to_sq = (targets & -targets).bit_length() - 1
+                    targets &= targets - 1
+                    moves.append(from_sq | to_sq << 6)
+
+        return moves
+
+    def parse_uci(self, notation: str) -> int:
+        """Legal move of UCI notation such as e2e4 or e7e8q"""
+        move = find_move(self.legal_moves(), *parse_uci(notation))
+        if move == NULL_MOVE:
+            raise ValueError(f"Illegal move: {notation}")
+        return move
+
+    def has_legal_move(self) -> bool:
+        """Like ``len(legal_moves()) > 0`` but stops at the first legal move found"""
+        us = self.turn
+        ours = self.bitboards[us]
+        king_sq = self.kings[us]
+        not_ours = ~self.occupied[us]
+        occupied = self.occupied[us] | self.occupied[us ^ 1]
+
+        # Castling is never needed, it is only legal when the king could also step onto the square it passes
+        targets = KING_ATTACKS[king_sq] & not_ours
+        without_king = occupied & ~(1 << king_sq)
+        while targets:
+            to_sq = (targets & -targets).bit_length() - 1
+            targets &= targets - 1
+            if not self.is_attacked(to_sq, us ^ 1, without_king):
+                return True
+
+        checkers, check_mask, pins = self._checks_and_pins()
+        if checkers & (checkers - 1):
+            return False
+
+        for piece_type in (QUEEN, ROOK, BISHOP, KNIGHT):
+            pieces = ours[piece_type]
+            while pieces:
+                from_sq = (pieces & -pieces).bit_length() - 1
+                pieces &= pieces - 1
+
+                match piece_type:
+                    case 2:
+                        targets = KNIGHT_ATTACKS[from_sq]
+                    case 3:
+                        targets = bishop_attacks(from_sq, occupied)
+                    case 4:
+                        targets = rook_attacks(from_sq, occupied)
+                    case _:
+                        targets = queen_attacks(from_sq, occupied)
+
+                if targets & not_ours & check_mask & pins.get(from_sq, ALL_SQUARES):
+                    return True
+
+        moves = array('H')
+        self._generate_pawn_moves(moves, check_mask, pins)
+        return len(moves) > 0
+
+    def _generate_king_moves(self, moves: array) -> None:
+        us = self.turn
+        king_sq = self.kings[us]
+        theirs = self.occupied[us ^ 1]
+
+        # The king must not shelter behind itself from a slider that checks it
+        occupied = (self.occupied[us] | theirs) & ~(1 << king_sq)
+        targets = KING_ATTACKS[king_sq] & ~self.occupied[us]
+        while targets:
+            to_sq = (targets & -targets).bit_length() - 1
+            targets &= targets - 1
+            if not self.is_attacked(to_sq, us ^ 1, occupied):
+                moves.append(king_sq | to_sq << 6 | (CAPTURE_BITS if theirs >> to_sq & 1 else 0))
+
+    def _generate_pawn_moves(self, moves: array, check_mask: int, pins: dict[int, int]) -> None:
+        us = self.turn
+        empty = ~(self.occupied[us] | self.occupied[us ^ 1])
+        theirs = self.occupied[us ^ 1]
+        pushes, attacks = PAWN_PUSHES[us], PAWN_ATTACKS[us]
+        start_y, seventh_y = (6, 1) if us == WHITE else (1, 6)
+
+        pawns = self.bitboards[us][PAWN]
+        while pawns:
+            from_sq = (pawns & -pawns).bit_length() - 1
+            pawns &= pawns - 1
+
+            mask = check_mask & pins[from_sq] if from_sq in pins else check_mask
+            captures = attacks[from_sq] & theirs & mask
+            push = pushes[from_sq] & empty
+            if push and square_y(from_sq) == start_y:
+                double_push = pushes[push.bit_length() - 1] & empty & mask
+                if double_push:
+                    moves.append(from_sq | (double_push.bit_length() - 1) << 6 | DOUBLE_PUSH_BITS)
+            push &= mask
+
+            if self.ep_square >= 0 and attacks[from_sq] >> self.ep_square & 1:
+                move = from_sq | self.ep_square << 6 | EN_PASSANT_BITS
+                if self._is_legal_en_passant(move):
+                    moves.append(move)
+
+            if square_y(from_sq) == seventh_y:
+                while captures:
+                    to_sq = (captures & -captures).bit_length() - 1
+                    captures &= captures - 1
+                    for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                        moves.append(from_sq | to_sq << 6 | promotion_flags(promotion, True) << 12)
+                if push:
+                    for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                        moves.append(from_sq | (push.bit_length() - 1) << 6 | promotion_flags(promotion) << 12)
+                continue
+
+            while captures:
+                to_sq = (captures & -captures).bit_length() - 1
+                captures &= captures - 1
+                moves.append(from_sq | to_sq << 6 | CAPTURE_BITS)
+            if push:
+                moves.append(from_sq | (push.bit_length() - 1) << 6)
+
+    def _is_legal_en_passant(self, move: int) -> bool:
+        """En passant removes two pieces from a line through the king, so it is verified by playing it"""
+        us = self.turn
+        undo = self.make_move(move)
+        is_legal = not self.is_attacked(self.kings[us], us ^ 1)
+        self.unmake_move(move, undo)
+        return is_legal
+
+    def _generate_castling(self, moves: array) -> None:
+        board = self.board
+        them = self.turn ^ 1
+        base, king_side, queen_side, rook = (56, WHITE_KING_SIDE, WHITE_QUEEN_SIDE, ROOK) if self.turn == WHITE \
+            else (0, BLACK_KING_SIDE, BLACK_QUEEN_SIDE, -ROOK)
+        king_sq = base + 4
+
+        if self.kings[self.turn] != king_sq or not self.castling & (king_side | queen_side):
+            return
+
+        if self.castling & king_side and board[base + 7] == rook and board[base + 5] == board[base + 6] == EMPTY \
+                and not self.is_attacked(base + 5, them) and not self.is_attacked(base + 6, them):
+            moves.append(king_sq | (base + 6) << 6 | KING_CASTLE << 12)
+
+        if self.castling & queen_side and board[base] == rook \
+                and board[base + 1] == board[base + 2] == board[base + 3] == EMPTY \
+                and not self.is_attacked(base + 3, them) and not self.is_attacked(base + 2, them):
+            moves.append(king_sq | (base + 2) << 6 | QUEEN_CASTLE << 12)
+
+    def make_move(self, move: int) -> Undo:
+        from_sq, to_sq, flags = move & 63, move >> 6 & 63, move >> 12
+        us = self.turn
+        undo = Undo(self.board[to_sq], self.castling, self.ep_square, self.half_clock, self.key)
+        self.key_history.append(self.key)
+
+        self.half_clock += 1
+        if undo.captured != EMPTY:
+            self._remove(to_sq)
+            self.half_clock = 0
+
+        code = self._remove(from_sq)
+        if code == PAWN or code == -PAWN:
+            self.half_clock = 0
+
+        ep_square = -1
+        match flags:
+            case 0:
+                pass
+            case 1:
+                ep_square = (from_sq + to_sq) // 2
+            case 2:
+                self._put(to_sq - 1, self._remove(to_sq + 1))
+            case 3:
+                self._put(to_sq + 1, self._remove(to_sq - 2))
+            case 5:
+                undo = undo._replace(captured=self._remove(to_sq + 8 if us == WHITE else to_sq - 8))
+            case _ if flags & PROMOTION:
+                code = move_promotion(move) if us == WHITE else -move_promotion(move)
+        self._put(to_sq, code)
+
+        self.key ^= CASTLING_KEYS[self.castling] ^ WHITE_TURN_KEY
+        self.castling &= CASTLING_MASK[from_sq] & CASTLING_MASK[to_sq]
+        self.key ^= CASTLING_KEYS[self.castling]
+        if us == BLACK:
+            self.fullmove += 1
+        self.turn = us ^ 1
+
+        if self.ep_square >= 0:
+            self.key ^= EN_PASSANT_KEYS[square_x(self.ep_square)]
+        self.ep_square = ep_square if ep_square >= 0 and self._can_capture_en_passant(ep_square) else -1
+        if self.ep_square >= 0:
+            self.key ^= EN_PASSANT_KEYS[square_x(self.ep_square)]
+        return undo
+
+    def unmake_move(self, move: int, undo: Undo) -> None:
+        from_sq, to_sq, flags = move & 63, move >> 6 & 63, move >> 12
+        us = self.turn ^ 1
+        self.turn = us
+        if us == BLACK:
+            self.fullmove -= 1
+
+        code = self._remove(to_sq)
+        if flags & PROMOTION:
+            code = PAWN if us == WHITE else -PAWN
+        self._put(from_sq, code)
+
+        match flags:
+            case 2:
+                self._put(to_sq + 1, self._remove(to_sq - 1))
+            case 3:
+                self._put(to_sq - 2, self._remove(to_sq + 1))
+            case 5:
+                self._put(to_sq + 8 if us == WHITE else to_sq - 8, undo.captured)
+            case _ if undo.captured != EMPTY:
+                self._put(to_sq, undo.captured)
+
+        self.castling = undo.castling
+        self.ep_square = undo.ep_square
+        self.half_clock = undo.half_clock
+        self.key = undo.key
+        self.key_history.pop()
+
+    def push(self, move: int) -> None:
+        self.move_stack.append((move, self.make_move(move)))
+
+    def pop(self) -> int:
+        move, undo = self.move_stack.pop()
+        self.unmake_move(move, undo)
+        return move
+
+    def is_checkmate(self) -> bool:
+        return self.is_check() and not self.has_legal_move()
+
+    def is_stalemate(self) -> bool:
+        return not self.is_check() and not self.has_legal_move()
+
+    def repetition_count(self) -> int:
+        """How often the current position occurred, counting itself"""
+        count = 1
+        history = self.key_history
+        # Nothing before the last capture or pawn move can repeat, and only the same side to move can match
+        oldest = max(len(history) - self.half_clock, 0)
+        for i in range(len(history) - 2, oldest - 1, -2):
+            if history[i] == self.key:
+                count += 1
+        return count
+
+    def is_repetition(self, count: int = 3) -> bool:
+        return self.repetition_count() >= count
+
+    def is_insufficient_material(self) -> bool:
+        """Bare kings, or a single knight or bishop against a bare king"""
+        pieces = (self.occupied[WHITE] | self.occupied[BLACK]).bit_count()
+        if pieces == 2:
+            return True
+
+        minors = self.bitboards[WHITE][KNIGHT] | self.bitboards[WHITE][BISHOP] \
+            | self.bitboards[BLACK][KNIGHT] | self.bitboards[BLACK][BISHOP]
+        return pieces == 3 and minors != 0
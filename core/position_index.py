@@ -0,0 +1,185 @@
+"""Index from Zobrist key to every (game, ply) of a game archive that reached the position.
+
+The index file holds a small header, then the keys sorted ascending as uint64 and, in the same order,
+``game << 16 | ply`` as uint64, where ply counts the moves played before the position. Both arrays are
+memory-mapped NumPy arrays, so a lookup is a binary search that touches a few pages of the file and
+the positions are never turned into Python objects.
+
+The bulk indexer replays ranges of games on a process pool, each worker writing its keys sorted to a
+run file, and the runs are merged into the final arrays.
+
+    python -m core.position_index build games.pca games.pci --workers 8
+    python -m core.position_index query games.pca games.pci --fen "..."
+"""
+import argparse
+import concurrent.futures
+import os
+import struct
+import tempfile
+import time
+from array import array
+from typing import NamedTuple
+
+import numpy as np
+
+from core.archive import Archive
+from core.position import Position, STARTING_FEN
+from core.san import move_to_san
+
+MAGIC = b"PYCI"
+VERSION = 1
+# Padded to 32 bytes so the uint64 arrays after it stay aligned, NumPy copies unaligned arrays to search them
+HEADER = struct.Struct("<4sHxxIQ12x")
+GAMES_PER_TASK = 2000
+
+
+class ContinuationStats(NamedTuple):
+    move: int
+    games: int
+    white_wins: int
+    draws: int
+    black_wins: int
+
+
+def _index_range(archive_path: str, first: int, last: int, run_path: str) -> int:
+    """Keys of every position of games first to last - 1, sorted and saved to run_path"""
+    keys, values = array('Q'), array('Q')
+    with Archive(archive_path) as archive:
+        for game in range(first, last):
+            position = Position(archive.start_fen(game))
+            keys.append(position.key)
+            values.append(game << 16)
+            for ply, move in enumerate(archive.moves(game), 1):
+                position.make_move(move)
+                keys.append(position.key)
+                values.append(game << 16 | ply)
+
+    sorted_keys = np.frombuffer(keys, dtype=np.uint64)
+    order = np.argsort(sorted_keys, kind="stable")
+    np.save(run_path, np.stack((sorted_keys[order], np.frombuffer(values, dtype=np.uint64)[order])))
+    return len(keys)
+
+
+def build_index(archive_path: str, index_path: str, workers: int = os.cpu_count() or 1,
+                games_per_task: int = GAMES_PER_TASK) -> int:
+    """Index every position of the archive, returning the number of entries"""
+    with Archive(archive_path) as archive:
+        game_count = len(archive)
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(index_path))) as run_dir:
+        ranges = [(first, min(first + games_per_task, game_count)) for first in range(0, game_count, games_per_task)]
+        run_paths = [os.path.join(run_dir, f"run{i}.npy") for i in range(len(ranges))]
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            sizes = list(executor.map(_index_range, [archive_path] * len(ranges), *zip(*ranges), run_paths)) \
+                if ranges else []
+        total = sum(sizes)
+
+        with open(index_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, game_count, total))
+        keys = np.lib.format.open_memmap(index_path + ".tmp", mode="w+", dtype=np.uint64, shape=(2, total))
+        offset = 0
+        for run_path, size in zip(run_paths, sizes):
+            keys[:, offset:offset + size] = np.load(run_path, mmap_mode="r")
+            offset += size
+
+        # The runs are already sorted, a stable sort of their concatenation is a merge
+        order = np.argsort(keys[0], kind="stable")
+        with open(index_path, "ab") as f:
+            for row in (0, 1):
+                for start in range(0, total, 1 << 22):
+                    f.write(np.ascontiguousarray(keys[row][order[start:start + (1 << 22)]], dtype="<u8").tobytes())
+        del keys, order
+        os.remove(index_path + ".tmp")
+    return total
+
+
+class PositionIndex:
+    def __init__(self, index_path: str, archive: Archive) -> None:
+        with open(index_path, "rb") as f:
+            magic, version, game_count, self.size = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{index_path} is not a version {VERSION} position index")
+        if game_count != len(archive):
+            raise ValueError(f"{index_path} indexes {game_count} games, the archive has {len(archive)}")
+
+        self.archive = archive
+        if self.size == 0:
+            self._keys = self._values = np.empty(0, dtype="<u8")
+            return
+        self._keys = np.memmap(index_path, dtype="<u8", mode="r", offset=HEADER.size, shape=(self.size,))
+        self._values = np.memmap(index_path, dtype="<u8", mode="r", offset=HEADER.size + self.size * 8,
+                                 shape=(self.size,))
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _values_of(self, key: int) -> np.ndarray:
+        key = np.uint64(key)
+        return self._values[np.searchsorted(self._keys, key, "left"):np.searchsorted(self._keys, key, "right")]
+
+    def _first_values_of(self, key: int) -> np.ndarray:
+        """One value per game, the first ply it reached the position, as a repetition indexes it again"""
+        values = np.sort(self._values_of(key))
+        _, first = np.unique(values >> np.uint64(16), return_index=True)
+        return values[first]
+
+    def count(self, key: int) -> int:
+        """Games that reached the position"""
+        return len(self._first_values_of(key))
+
+    def games(self, key: int) -> list[tuple[int, int]]:
+        """(game, ply) of every game that reached the position, at the first time it did"""
+        return [(value >> 16, value & 0xFFFF) for value in self._first_values_of(key).tolist()]
+
+    def continuations(self, key: int) -> list[ContinuationStats]:
+        """Moves played from the position with white wins, draws and black wins, most played first, each game
+        counted once with the move it played the first time there"""
+        stats: dict[int, list[int]] = {}
+        for game, ply in self.games(key):
+            if ply >= self.archive.ply_count(game):
+                continue
+
+            counts = stats.setdefault(self.archive.move(game, ply), [0, 0, 0, 0])
+            counts[0] += 1
+            match self.archive.result(game):
+                case "1-0":
+                    counts[1] += 1
+                case "1/2-1/2":
+                    counts[2] += 1
+                case "0-1":
+                    counts[3] += 1
+        return sorted((ContinuationStats(move, *counts) for move, counts in stats.items()), key=lambda s: -s.games)
+
+    def lookup_fen(self, fen: str) -> list[ContinuationStats]:
+        return self.continuations(Position(fen).key)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build or query a position index over a game archive")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build")
+    build_parser.add_argument("archive")
+    build_parser.add_argument("index")
+    build_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    query_parser = commands.add_parser("query")
+    query_parser.add_argument("archive")
+    query_parser.add_argument("index")
+    query_parser.add_argument("--fen", default=STARTING_FEN)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start_time = time.perf_counter()
+        entries = build_index(args.archive, args.index, args.workers)
+        elapsed = time.perf_counter() - start_time
+        print(f"{entries} positions indexed in {elapsed:.2f}s ({entries / max(elapsed, 1e-9):,.0f} positions/s)")
+    else:
+        with Archive(args.archive) as game_archive:
+            index = PositionIndex(args.index, game_archive)
+            query = Position(args.fen)
+            start_time = time.perf_counter()
+            continuations = index.continuations(query.key)
+            print(f"{index.count(query.key)} games reached the position, "
+                  f"looked up in {(time.perf_counter() - start_time) * 1000:.2f}ms")
+            for stat in continuations:
+                print(f"{move_to_san(query, stat.move):<8} {stat.games:>7} games  "
+                      f"+{stat.white_wins} ={stat.draws} -{stat.black_wins}")
@@ -0,0 +1,81 @@
+"""Standard algebraic notation (SAN), written and parsed against the legal moves of a Position."""
+import re
+
+from core.move import KING_CASTLE, QUEEN_CASTLE, move_from, move_to, move_flags, move_promotion, is_capture
+from core.position import Position, PAWN, EMPTY, PIECE_SYMBOLS, FILES, RANKS, square_x, square_y, square_name, \
+    parse_square
+
+SAN_PATTERN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQnbrq]))?$")
+CASTLING_SAN = {"O-O": KING_CASTLE, "0-0": KING_CASTLE, "O-O-O": QUEEN_CASTLE, "0-0-0": QUEEN_CASTLE}
+
+
+def move_to_san(position: Position, move: int, moves=None, suffix=True) -> str:
+    """SAN of a legal move, with + or # when suffix is set. ``moves`` may pass the already generated legal moves"""
+    if moves is None:
+        moves = position.legal_moves()
+    from_sq, to_sq = move_from(move), move_to(move)
+
+    if move_flags(move) == KING_CASTLE:
+        san = "O-O"
+    elif move_flags(move) == QUEEN_CASTLE:
+        san = "O-O-O"
+    elif abs(position.board[from_sq]) == PAWN:
+        san = FILES[square_x(from_sq)] + "x" if is_capture(move) else ""
+        san += square_name(to_sq)
+        if move_promotion(move) != EMPTY:
+            san += "=" + PIECE_SYMBOLS[move_promotion(move)].upper()
+    else:
+        code = position.board[from_sq]
+        others = [move_from(other) for other in moves
+                  if move_to(other) == to_sq and move_from(other) != from_sq and position.board[move_from(other)] == code]
+
+        san = PIECE_SYMBOLS[abs(code)].upper()
+        if others:
+            # File if it tells the pieces apart, else rank, else both
+            if all(square_x(other) != square_x(from_sq) for other in others):
+                san += FILES[square_x(from_sq)]
+            elif all(square_y(other) != square_y(from_sq) for other in others):
+                san += RANKS[square_y(from_sq)]
+            else:
+                san += square_name(from_sq)
+        if is_capture(move):
+            san += "x"
+        san += square_name(to_sq)
+
+    if suffix:
+        undo = position.make_move(move)
+        if position.is_check():
+            san += "+" if position.has_legal_move() else "#"
+        position.unmake_move(move, undo)
+    return san
+
+
+def parse_san(position: Position, san: str, moves=None) -> int:
+    """Legal move written in SAN, check marks and annotations are ignored"""
+    if moves is None:
+        moves = position.legal_moves()
+    text = san.rstrip("+#!?")
+
+    if text in CASTLING_SAN:
+        for move in moves:
+            if move_flags(move) == CASTLING_SAN[text]:
+                return move
+        raise ValueError(f"Illegal move: {san}")
+
+    match = SAN_PATTERN.match(text)
+    if match is None:
+        raise ValueError(f"Invalid SAN: {san}")
+
+    piece, file, rank, to_name, promotion = match.groups()
+    piece_type = PIECE_SYMBOLS.index(piece.lower()) if piece else PAWN
+    promotion = PIECE_SYMBOLS.index(promotion.lower()) if promotion else EMPTY
+    to_sq = parse_square(to_name)
+
+    candidates = [move for move in moves
+                  if move_to(move) == to_sq and move_promotion(move) == promotion
+                  and abs(position.board[move_from(move)]) == piece_type
+                  and (file is None or FILES[square_x(move_from(move))] == file)
+                  and (rank is None or RANKS[square_y(move_from(move))] == rank)]
+    if len(candidates) != 1:
+        raise ValueError(f"{'Ambiguous' if candidates else 'Illegal'} move: {san}")
+    return candidates[0]
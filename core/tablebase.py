@@ -0,0 +1,98 @@
+"""Syzygy endgame tablebase probing.
+
+The tables are read by python-chess's ``chess.syzygy``, which memory-maps the .rtbw/.rtbz files and
+decodes blocks on demand. Without table files ``open_tablebase`` returns None and callers carry on without
+tablebases. Probe results are kept in an LRU keyed by Zobrist key, so replaying or redrawing the same
+endgame does not decode the same blocks again.
+"""
+import os
+from collections import OrderedDict
+
+import chess
+import chess.syzygy
+
+from core.move import NULL_MOVE, is_capture, move_from
+from core.position import Position, PAWN, WHITE, BLACK
+
+CACHE_SIZE = 1 << 16
+
+
+class Tablebase:
+    def __init__(self, directory: str, cache_size: int = CACHE_SIZE) -> None:
+        self.directory = directory
+        self._tables = chess.syzygy.open_tablebase(directory)
+        # Table files are named after their pieces, KQvK.rtbw holds three
+        names = [os.path.splitext(name)[0] for name in os.listdir(directory) if name.endswith(".rtbw")]
+        self.max_pieces = max((len(name) - 1 for name in names), default=0)
+        self.cache_size = cache_size
+        self._wdl: OrderedDict[int, int | None] = OrderedDict()
+        self._dtz: OrderedDict[int, int | None] = OrderedDict()
+
+    def close(self) -> None:
+        self._tables.close()
+
+    def can_probe(self, position: Position) -> bool:
+        pieces = (position.occupied[WHITE] | position.occupied[BLACK]).bit_count()
+        return pieces <= self.max_pieces and position.castling == 0
+
+    def _probe(self, cache: OrderedDict, probe, position: Position) -> int | None:
+        if position.key in cache:
+            cache.move_to_end(position.key)
+            return cache[position.key]
+
+        try:
+            value = probe(chess.Board(position.fen()))
+        except (KeyError, chess.syzygy.MissingTableError):
+            value = None
+        cache[position.key] = value
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        return value
+
+    def probe_wdl(self, position: Position) -> int | None:
+        """2 win, 1 win spoiled by the fifty move rule, 0 draw, -1 and -2 the same losses, for the side to move"""
+        if not self.can_probe(position):
+            return None
+        return self._probe(self._wdl, self._tables.probe_wdl, position)
+
+    def probe_dtz(self, position: Position) -> int | None:
+        """Plies to the next capture or pawn move of a perfect game, negative when the side to move loses"""
+        if not self.can_probe(position):
+            return None
+        return self._probe(self._dtz, self._tables.probe_dtz, position)
+
+    def best_move(self, position: Position) -> int:
+        """Move keeping the best result, winning with the fastest progress, or NULL_MOVE when not in the tables"""
+        if self.probe_wdl(position) is None:
+            return NULL_MOVE
+
+        best, best_rank = NULL_MOVE, None
+        for move in position.legal_moves():
+            zeroing = is_capture(move) or abs(position.board[move_from(move)]) == PAWN
+            undo = position.make_move(move)
+            wdl = self.probe_wdl(position)
+            dtz = self.probe_dtz(position)
+            is_mate = position.is_checkmate()
+            position.unmake_move(move, undo)
+            if wdl is None or dtz is None:
+                return NULL_MOVE
+
+            # Rank by the result for us, then prefer mates and zeroing moves when winning and the longest
+            # resistance when losing
+            result = -wdl
+            if result > 0:
+                rank = (result, is_mate, zeroing, dtz)
+            else:
+                rank = (result, False, False, dtz if result < 0 else 0)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = move, rank
+        return best
+
+
+def open_tablebase(directory: str) -> Tablebase | None:
+    """Tables in directory, or None without any table there"""
+    if not os.path.isdir(directory):
+        return None
+    if not any(name.endswith(".rtbw") for name in os.listdir(directory)):
+        return None
+    return Tablebase(directory)
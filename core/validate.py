@@ -0,0 +1,125 @@
+"""Replay a PGN corpus through the rules on several processes and report throughput.
+
+Every game is replayed move by move: each SAN move has to resolve to exactly one legal move, the Zobrist
+key and FEN kept incrementally have to match a fresh computation at the end, and the final board state
+has to agree with the game result (a mate or stalemate on the board cannot be scored otherwise).
+
+    python -m core.validate games.pgn --workers 8
+    python -m core.validate games.pgn --scaling --limit 5000
+"""
+import argparse
+import itertools
+import os
+import time
+from typing import NamedTuple, Iterable
+
+from core.game_state import board_state, expected_result
+from core.pgn import PgnGame, read_file
+from core.pool import imap_unordered
+from core.position import Position
+from core.san import parse_san
+
+CHUNK_SIZE = 200
+
+
+class Report(NamedTuple):
+    games: int
+    plies: int
+    errors: list[str]
+
+
+def validate_game(game: PgnGame) -> tuple[int, str | None]:
+    """Plies replayed and the first problem found, if any"""
+    try:
+        position = Position(game.fen)
+    except (ValueError, IndexError) as ex:
+        return 0, f"invalid FEN {game.fen}: {ex}"
+
+    for ply, san in enumerate(game.moves):
+        try:
+            position.make_move(parse_san(position, san))
+        except ValueError as ex:
+            return ply, f"ply {ply + 1}: {ex}"
+
+    plies = len(game.moves)
+    if position.key != position.compute_key():
+        return plies, "incremental Zobrist key differs from the recomputed one"
+
+    fen = position.fen()
+    if Position(fen).fen() != fen:
+        return plies, f"final FEN does not round trip: {fen}"
+    if "FinalFEN" in game.headers and game.headers["FinalFEN"].split()[:4] != fen.split()[:4]:
+        return plies, f"final FEN {fen} differs from FinalFEN header {game.headers['FinalFEN']}"
+
+    expected = expected_result(board_state(position))
+    if expected is not None and game.result not in (expected, "*"):
+        return plies, f"result {game.result} but the final position scores {expected}"
+    return plies, None
+
+
+def validate_games(start: int, games: list[PgnGame]) -> Report:
+    plies, errors = 0, []
+    for index, game in enumerate(games, start):
+        game_plies, error = validate_game(game)
+        plies += game_plies
+        if error is not None:
+            name = " - ".join(game.headers[tag] for tag in ("White", "Black") if tag in game.headers)
+            errors.append(f"game {index + 1}{f' ({name})' if name else ''}: {error}")
+    return Report(len(games), plies, errors)
+
+
+def _chunks(games: Iterable[PgnGame], size: int):
+    games = iter(games)
+    start = 0
+    while chunk := list(itertools.islice(games, size)):
+        yield start, chunk
+        start += len(chunk)
+
+
+def run(games: Iterable[PgnGame], workers: int, chunk_size: int = CHUNK_SIZE) -> tuple[Report, float]:
+    """Validate games on a pool of worker processes, keeping only a few chunks in flight"""
+    total = Report(0, 0, [])
+    start_time = time.perf_counter()
+    tasks = ((validate_games, start, chunk) for start, chunk in _chunks(games, chunk_size))
+    for report in imap_unordered(tasks, workers):
+        total = Report(total.games + report.games, total.plies + report.plies, total.errors + report.errors)
+
+    total.errors.sort(key=lambda error: int(error.split()[1].rstrip(":")))
+    return total, time.perf_counter() - start_time
+
+
+def print_report(report: Report, elapsed: float, workers: int) -> None:
+    for error in report.errors:
+        print(error)
+    print(f"{report.games} games, {report.plies} plies, {len(report.errors)} errors in {elapsed:.2f}s "
+          f"on {workers} workers ({report.games / max(elapsed, 1e-9):,.0f} games/s, "
+          f"{report.plies / max(elapsed, 1e-9):,.0f} plies/s)")
+
+
+def run_scaling(path: str, max_workers: int, limit: int | None, chunk_size: int) -> None:
+    """Same corpus on 1, 2, 4, ... workers, with the speedup over a single worker"""
+    worker_counts = sorted({min(1 << i, max_workers) for i in range(max_workers.bit_length() + 1)})
+    base_rate = None
+    for workers in worker_counts:
+        report, elapsed = run(itertools.islice(read_file(path), limit), workers, chunk_size)
+        rate = report.games / max(elapsed, 1e-9)
+        base_rate = base_rate or rate
+        print(f"{workers:>3} workers: {rate:>9,.0f} games/s, speedup {rate / base_rate:.2f}x, "
+              f"efficiency {rate / base_rate / workers:.0%}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay and validate a PGN corpus on several processes")
+    parser.add_argument("pgn")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--limit", type=int, help="only the first N games")
+    parser.add_argument("--chunk", type=int, default=CHUNK_SIZE, help="games sent to a worker at a time")
+    parser.add_argument("--scaling", action="store_true", help="measure games/s for 1, 2, 4, ... workers")
+    args = parser.parse_args()
+
+    if args.scaling:
+        run_scaling(args.pgn, args.workers, args.limit, args.chunk)
+    else:
+        result, seconds = run(itertools.islice(read_file(args.pgn), args.limit), args.workers, args.chunk)
+        print_report(result, seconds, args.workers)
+        raise SystemExit(1 if result.errors else 0)
@@ -1,4 +1,7 @@
+import itertools
 import json
+import os
+from array import array
 import math
 from collections import deque
 
@@ -6,7 +9,18 @@ import numpy as np
 import pygame
 from pygame import SurfaceType, Surface
 
-from components.piece import Piece, Rook, Pawn, Knight, King, Bishop, Queen
+from components.image_cache import board_texture, clear_renders, glyph
+from components.piece import Piece, Rook, Pawn, Knight, King, Bishop, Queen, GreenDot, SQUARE_SIZE
+from core.position import Position, STARTING_FEN, WHITE, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, EMPTY, \
+    square, square_x, square_y, move_to_uci
+from core.archive import Archive, ArchiveWriter
+from core.book import PolyglotBook
+from core.game_state import board_state
+from core.history import GameHistory
+from core.move import NULL_MOVE, move_from, move_to, move_promotion, find_move, changed_squares
+from core.pgn import PgnGame, open_pgn, read_games
+from core.san import move_to_san, parse_san
+from core.tablebase import Tablebase, open_tablebase
 from services.base_service import BaseService
 from services.setting import Setting
 from services.socket_service import SocketService
@@ -16,8 +30,12 @@ from services.stockfish_service import StockfishService
 class Board(BaseService):
     row_notation = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h']
     col_notation = ['8', '7', '6', '5', '4', '3', '2', '1']
+    notation_font = './assets/fonts/Roboto-Regular.ttf'
+    notation_font_size = 15
+    sprite_types = {PAWN: Pawn, KNIGHT: Knight, BISHOP: Bishop, ROOK: Rook, QUEEN: Queen, KING: King}
+    promotion_types = {"Q": QUEEN, "R": ROOK, "B": BISHOP, "N": KNIGHT}
 
-    def __init__(self, stockfish: StockfishService, setting: Setting, socket_service: SocketService):
+    def __init__(self, stockfish: StockfishService | None, setting: Setting, socket_service: SocketService | None):
         # Code
         BaseService.__init__(self)
         self.socket_service = socket_service
@@ -25,20 +43,31 @@ class Board(BaseService):
         self.setting = setting
         self._screen: Surface | SurfaceType = None
         self._board: Surface | SurfaceType
+        # Squares and coordinates of the theme and size in _static_key, and what is on the board surface now
+        self._static_layer: Surface | None = None
+        self._notation_layer: Surface | None = None
+        self._static_key: tuple | None = None
+        self._drawn_layers: tuple | None = None
 
         self.drawingPos = (200, 0)
 
-        self.minDimension: int = 0
-        self.rectDimension = 0
+        # Until a screen is set
+        self.minDimension: int = SQUARE_SIZE * 8
+        self.rectDimension = SQUARE_SIZE
 
+        self.position = Position()
+        # Legal moves of the position with key _legal_moves_key, generated on first use
+        self._legal_moves = array('H')
+        self._legal_moves_key: int | None = None
+        self._moves_by_square: dict[int, list[int]] | None = None
         self.coordinate = np.full((8, 8), None, dtype=Piece)
 
         pygame.font.init()
-        self.font = pygame.font.Font('./assets/fonts/Roboto-Regular.ttf', 15)
         self.selectedPiece: Piece = None
 
-        self._is_white_turn = True
         self.best_move = None
+        self.book = self.open_book(setting.book_path)
+        self.tablebase = self.open_tablebase(setting.tablebase_path)
         self.is_online = False
         self.is_ai = False
         self.ai_turn = not self.is_white_turn
@@ -50,14 +79,23 @@ class Board(BaseService):
         self.pgn: list[str] = []
         self.squares: list[str] = []
         self.fen_pos: list[str] = []
+        # Undone moves with their pgn, squares and fen_pos entries, the last one is redone first
+        self.redo_stack: list[tuple[int, str, str, str]] = []
+        # Moves since the last FEN load, and the ply shown instead of the live game when browsing them
+        self.history = GameHistory()
+        self.view_ply: int | None = None
+        self.view_position: Position | None = None
+        self.view_pieces = pygame.sprite.Group()
+        # A game loaded from a file with its SAN and UCI moves, browsed instead of the live game until closed
+        self.loaded_history: GameHistory | None = None
+        self.loaded_pgn: list[str] = []
+        self.loaded_squares: list[str] = []
 
         self.pieces = pygame.sprite.Group()
 
-        self.moves = 1
-        self.half_clock = 0
-
         # 0: Normal, 1: Check, 2: Checkmate as white, 3: Checkmate as black, 4: Draw - Player Offered,
-        # 5: Draw - Stale mate, 6: Draw - 50 Moves, 7: Draw - Three-fold repetition, 8: Draw - Insufficient Pieces
+        # 5: Draw - Stale mate, 6: Draw - 50 Moves, 7: Draw - Three-fold repetition, 8: Draw - Insufficient Pieces,
+        # 9: White win - Tablebase, 10: Black win - Tablebase, 11: Draw - Tablebase
         self.board_state = 0
 
         self.capture_sound = pygame.mixer.Sound("./assets/audio/Capture.mp3")
@@ -65,6 +103,8 @@ class Board(BaseService):
 
         self.set_fen_callback = None
         self.set_pgn_callback = None
+        # Called from the engine thread once its move is queued
+        self.message_callback = None
 
         # self.setBoardByFEN("rnbqkbnr/pppp1ppp/8/4p3/3P4/8/PPP1PPPP/RNBQKBNR w KQkq - 0 2")
         # self.setBoardByFEN("2b1kbnr/1P3ppp/8/4p3/8/8/RPP1PPPP/1NB1KBNR b Kk - 0 9")
@@ -88,13 +128,6 @@ class Board(BaseService):
         self.coordinate = np.full((8, 8), None, dtype=Piece)
         self.pieces.empty()
 
-    def _compute_all_moves(self):
-        for piece in self.pieces:
-            if not isinstance(piece, Piece):
-                pass
-
-            piece.compute_possible_moves(self.coordinate)
-
     @property
     def screen(self) -> Surface | SurfaceType:
         return self._screen
@@ -102,9 +135,15 @@ class Board(BaseService):
     @screen.setter
     def screen(self, screen: Surface | SurfaceType):
         self._screen = screen
-        self.minDimension = min(self.screen.get_width(), self.screen.get_height())
-        self.rectDimension = math.floor(self.minDimension / 8)
-        self.board = pygame.Surface((self.minDimension, self.minDimension))
+        # The side panels are as wide as the board is from the left edge
+        size = max(min(self.screen.get_width() - 2 * self.drawingPos[0], self.screen.get_height()), 8)
+        self.board = pygame.Surface((size, size))
+
+        # Sprites are drawn at the square size
+        self.deselect_piece()
+        self.refresh_pieces()
+        if self.view_ply is not None:
+            self.view(self.view_ply)
 
     @property
     def board(self) -> Surface | SurfaceType:
@@ -115,14 +154,11 @@ class Board(BaseService):
         self._board = board
         self.minDimension = min(self._board.get_width(), self._board.get_height())
         self.rectDimension = math.floor(self.minDimension / 8)
+        self.invalidate()
 
     @property
     def is_white_turn(self) -> bool:
-        return self._is_white_turn
-
-    @is_white_turn.setter
-    def is_white_turn(self, turn: bool) -> None:
-        self._is_white_turn = turn
+        return self.position.turn == WHITE
 
     def setDrawingPos(self, startPos: tuple[0, 0]) -> None:
         pass
@@ -138,92 +174,149 @@ class Board(BaseService):
     def set_board_by_fen(self, fen: str):
         self.empty_board()
         self.logger.info(f"Loading FEN Board: {fen}")
-        self.stockfish.set_fen_position(fen)
-
-        items = fen.split(" ")
+        # No engine when rendering headless
+        if self.stockfish is not None:
+            self.stockfish.set_fen_position(fen)
 
-        fenBoard = items[0].split("/")
-        self.load_FEN_pieces(fenBoard)
+        self.position.set_fen(fen)
+        self.redo_stack.clear()
+        self.restore_key_history(fen)
+        self.load_position_pieces()
 
-        self.is_white_turn = True if items[1].lower() == 'w' else False
         if self.is_online is False:
             self.real_player_turn = self.is_white_turn
 
         self.ai_turn = not self.is_white_turn
 
-        black_king, white_king = self.get_black_and_white_king()
-        black_king.can_castle_king, black_king.can_castle_queen = False, False
-        white_king.can_castle_king, white_king.can_castle_queen = False, False
-        for char in items[2]:
-            match char:
-                case "K":
-                    white_king.can_castle_king = True
-                case "Q":
-                    white_king.can_castle_queen = True
-                case "k":
-                    black_king.can_castle_king = True
-                case "q":
-                    black_king.can_castle_queen = True
-
-        if items[3] != "-":
-            x = Board.row_notation.index(items[3][0])
-            for y in [1, -1]:
-                piece = self.coordinate[x, y]
-                if isinstance(piece, Pawn):
-                    piece.is_first_move = True
-
-        self.half_clock = int(items[4])
-
-        self.moves = int(items[5]) * 2 - 1 if items[1] == 'w' else int(items[5]) * 2
-
-        self.compute_legal_move()
         if len(self.fen_pos) == 0:
             self.fen_pos = [self.get_current_fen()]
+        self.history = GameHistory(fen, start_ply=len(self.fen_pos) - 1)
+        self.view(None if self.loaded_history is None else self.view_ply)
         self.update_board_state()
 
-    def load_FEN_pieces(self, fenBoard: list[str]) -> None:
-        for y, item in enumerate(fenBoard):
-            offset = 0
-            for char in item:
-                if offset > 7:
-                    break
-
-                p = char
-                match p:
-                    case "r":
-                        self.set_piece(Rook(False, offset, y))
-                    case "R":
-                        self.set_piece(Rook(True, offset, y))
-                    case "n":
-                        self.set_piece(Knight(False, offset, y))
-                    case "N":
-                        self.set_piece(Knight(True, offset, y))
-                    case "b":
-                        self.set_piece(Bishop(False, offset, y))
-                    case "B":
-                        self.set_piece(Bishop(True, offset, y))
-                    case "q":
-                        self.set_piece(Queen(False, offset, y))
-                    case "Q":
-                        self.set_piece(Queen(True, offset, y))
-                    case "k":
-                        self.set_piece(King(False, offset, y))
-                    case "K":
-                        self.set_piece(King(True, offset, y))
-                    case "p":
-                        self.set_piece(Pawn(False, offset, y))
-                    case "P":
-                        self.set_piece(Pawn(True, offset, y))
-                    case _:
-                        if p.isnumeric():
-                            offset += int(p) - 1
-                        else:
-                            raise ValueError(f"p is not a number: {p}")
-                offset += 1
-
-    def set_board_by_notations(self, notations: list[str]) -> None:
+    def restore_key_history(self, fen: str) -> None:
+        """Rebuild the repetition history when fen is the latest entry of fen_pos (undo, online sync)"""
+        if len(self.fen_pos) == 0 or self.fen_pos[-1] != fen:
+            return
+
+        history = self.fen_pos[max(len(self.fen_pos) - 1 - self.position.half_clock, 0):-1]
+        self.position.key_history = [Position(item).key for item in history]
+
+    def create_piece_sprite(self, code: int, x: int, y: int) -> Piece:
+        return Board.sprite_types[abs(code)](code > 0, x, y, size=self.rectDimension)
+
+    def load_position_pieces(self) -> None:
+        for sq, code in enumerate(self.position.board):
+            if code != EMPTY:
+                self.set_piece(self.create_piece_sprite(code, square_x(sq), square_y(sq)))
+
+    def refresh_pieces(self, squares=range(64)) -> None:
+        """Replace the sprites on the given squares that no longer match the position"""
+        for sq in squares:
+            code = self.position.board[sq]
+            x, y = square_x(sq), square_y(sq)
+            piece = self.coordinate[x, y]
+            if code == EMPTY:
+                if piece is not None:
+                    self.coordinate[x, y] = None
+                    self.pieces.remove(piece)
+                continue
+
+            if not isinstance(piece, Board.sprite_types[abs(code)]) or piece.is_white != (code > 0) \
+                    or piece.size != self.rectDimension:
+                self.set_piece(self.create_piece_sprite(code, x, y))
+
+    def set_board_by_notations(self, notations: list[str], fen: str = STARTING_FEN) -> None:
         self.logger.info(f"Loading Notations Board: {notations}")
-        raise NotImplementedError("")
+        position = Position(fen)
+        moves = array('H')
+        for notation in notations:
+            move = parse_san(position, notation)
+            moves.append(move)
+            position.make_move(move)
+        self.set_board_by_moves(moves, fen)
+
+    def set_board_by_moves(self, moves, fen: str = STARTING_FEN) -> None:
+        position = Position(fen)
+        pgn, squares, fen_pos = [], [], [position.fen()]
+        for move in moves:
+            pgn.append(move_to_san(position, move))
+            squares.append(move_to_uci(move))
+            position.make_move(move)
+            fen_pos.append(position.fen())
+
+        # Played from the start position so the moves can be undone
+        self.pgn, self.squares, self.fen_pos = pgn, squares, fen_pos[:1]
+        self.set_board_by_fen(fen)
+        for move in moves:
+            self.position.push(move)
+            self.history.append(move)
+        self.fen_pos = fen_pos
+        self.sync_position()
+
+    @staticmethod
+    def read_pgn_game(path: str, index: int) -> PgnGame:
+        """The index-th game of a PGN file, reading no further than that game"""
+        with open_pgn(path) as stream:
+            game = next(itertools.islice(read_games(stream), index, None), None)
+        if game is None:
+            raise ValueError(f"{path} has no game {index}")
+        return game
+
+    def set_board_by_pgn(self, path: str, index: int = 0) -> None:
+        """Play on from the index-th game of a PGN file, replacing the live game"""
+        game = self.read_pgn_game(path, index)
+        self.set_board_by_notations(game.moves, game.fen)
+
+    def set_board_by_archive(self, path: str, game: int, ply: int | None = None) -> None:
+        """Play on from a game of a binary archive up to the given ply, replacing the live game"""
+        with Archive(path) as archive:
+            moves = archive.moves(game)
+            fen = archive.start_fen(game)
+        self.set_board_by_moves(moves[:ply], fen)
+
+    def browse_moves(self, moves, fen: str = STARTING_FEN) -> None:
+        """Browse a game from its start position, leaving the live game as it is"""
+        position = Position(fen)
+        pgn, squares = [], []
+        for move in moves:
+            pgn.append(move_to_san(position, move))
+            squares.append(move_to_uci(move))
+            position.make_move(move)
+
+        self.loaded_history = GameHistory(fen, moves)
+        self.loaded_pgn, self.loaded_squares = pgn, squares
+        self.view(0)
+
+    def browse_file(self, path: str, index: int = 0) -> None:
+        """Browse the index-th game of a PGN file or of a binary archive (.pca)"""
+        if path.endswith(".pca"):
+            with Archive(path) as archive:
+                if not 0 <= index < len(archive):
+                    raise ValueError(f"{path} has no game {index}")
+                self.browse_moves(archive.moves(index), archive.start_fen(index))
+            return
+
+        game = self.read_pgn_game(path, index)
+        self.browse_moves([move for _, move in game.replay()], game.fen)
+
+    def close_loaded_game(self) -> None:
+        self.loaded_history = None
+        self.loaded_pgn, self.loaded_squares = [], []
+        self.view(None)
+
+    def save_archive(self, path: str) -> None:
+        """Write the current game as a single game archive"""
+        start_fen = self.fen_pos[0] if self.fen_pos else STARTING_FEN
+        position = Position(start_fen)
+        moves = array('H')
+        for notation in self.squares:
+            moves.append(position.parse_uci(notation))
+            position.make_move(moves[-1])
+
+        headers = {} if start_fen == STARTING_FEN else {"SetUp": "1", "FEN": start_fen}
+        with ArchiveWriter(path) as writer:
+            writer.add(moves, headers=headers)
 
     def reset_board(self):
         self.pgn = []
@@ -234,7 +327,6 @@ class Board(BaseService):
         # TODO: Fix this shit
         self.real_player_turn = self.is_white_turn
 
-        self.moves = 1
         if self.is_online:
             self.socket_service.send(f'reset')
 
@@ -242,72 +334,119 @@ class Board(BaseService):
         self.logger.info("Loading default board...")
         self.set_board_by_fen("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")
 
-    def draw_board(self, rectDimension: int):
-        for i in range(64):
-            column = i % 8
-            row = i // 8
-            # self.logger.info(f"Column: {column}, Row: {row}")
-            if (column + row) % 2 == 0:
-                # pygame.draw.rect(self.screen, '#b58863', [relativeDimension[0] + (column * rectDimension),
-                #                                           row * rectDimension, rectDimension, rectDimension])
-                pygame.draw.rect(self.board, self.setting.color1, [(column * rectDimension),
-                                                                   (row * rectDimension),
-                                                                   rectDimension, rectDimension])
-            else:
-                pygame.draw.rect(self.board, self.setting.color2, [(column * rectDimension),
-                                                                   (row * rectDimension),
-                                                                   rectDimension, rectDimension])
-
-    def draw_notations(self):
+    def invalidate(self):
+        """Redraw the whole board on the next frame"""
+        self._drawn_layers = None
+
+    def static_layer(self) -> Surface:
+        """Squares, and coordinates on their own layer to go over the pieces, rendered again only when the
+        colours or the board size change"""
+        key = (self.setting.color1, self.setting.color2, self.minDimension)
+        if self._static_key != key:
+            if self._static_key is not None:
+                clear_renders()
+            self._static_layer = pygame.Surface((self.minDimension, self.minDimension))
+            self._static_layer.blit(board_texture(self.rectDimension, self.setting.color1, self.setting.color2),
+                                    (0, 0))
+            self._notation_layer = pygame.Surface((self.minDimension, self.minDimension), pygame.SRCALPHA)
+            self.draw_notations(self._notation_layer)
+            self._static_key = key
+            self.invalidate()
+        return self._static_layer
+
+    def draw_notations(self, surface: Surface):
+        """Coordinates on a transparent surface, copied rather than blended so they look the same once blitted"""
+        # The font size and margins are those of a SQUARE_SIZE square, scaled to the current one
+        def scaled(length: int) -> int:
+            return round(length * self.rectDimension / SQUARE_SIZE)
+
+        font_size = max(scaled(Board.notation_font_size), 6)
         for i in range(8):
-            numberImg = None
-            alphabetImg = None
-            if i % 2 == 0:
-                numberImg = self.font.render(Board.col_notation[i], True, self.setting.color1)
-                alphabetImg = self.font.render(Board.row_notation[i], True, self.setting.color1)
-
-            else:
-                numberImg = self.font.render(Board.col_notation[i], True, self.setting.color2)
-                alphabetImg = self.font.render(Board.row_notation[i], True, self.setting.color2)
+            colour = self.setting.color1 if i % 2 == 0 else self.setting.color2
+            numberImg = glyph(Board.notation_font, font_size, Board.col_notation[i], colour)
+            alphabetImg = glyph(Board.notation_font, font_size, Board.row_notation[i], colour)
 
             # Setup draw position at the end of the column
             numberRect = numberImg.get_rect()
-            numberRect.x = self.minDimension - 15
-            numberRect.y = self.rectDimension * i + 10
-            self.board.blit(numberImg, numberRect)
+            numberRect.x = self.minDimension - scaled(15)
+            numberRect.y = self.rectDimension * i + scaled(10)
+            surface.blit(numberImg, numberRect, special_flags=pygame.BLEND_RGBA_MAX)
 
             # Setup draw position at the bottom
             alphabetRect = numberImg.get_rect()
-            alphabetRect.x = 10 + self.rectDimension * i
-            alphabetRect.y = self.minDimension - 20
-            self.board.blit(alphabetImg, alphabetRect)
-
-    def draw_turn(self, rect_dimension):
-        if len(self.squares) == 0:
-            return
-        current_turn = self.squares[-1]
-        from_x, from_y, to_x, to_y = self.get_positions_by_square_turn(current_turn)
-        pygame.draw.rect(self.board, "lightgreen", [(from_x * rect_dimension),
-                                                    (from_y * rect_dimension),
-                                                    rect_dimension, rect_dimension])
-        pygame.draw.rect(self.board, "green", [(to_x * rect_dimension),
-                                               (to_y * rect_dimension),
-                                               rect_dimension, rect_dimension])
-
-    def draw_checked(self, rect_dimension):
-        if self.board_state != 1 and self.board_state != 2:
-            return
-
-        b_king, w_king = self.get_black_and_white_king()
-        team_king = w_king if self.is_white_turn else b_king
+            alphabetRect.x = scaled(10) + self.rectDimension * i
+            alphabetRect.y = self.minDimension - scaled(20)
+            surface.blit(alphabetImg, alphabetRect, special_flags=pygame.BLEND_RGBA_MAX)
+
+    def highlights(self) -> dict[int, str]:
+        """Colours of the squares of the last move and of a king in check"""
+        result = {}
+        squares = self.squares if self.loaded_history is None else self.loaded_squares
+        if self.view_ply is None:
+            last_move = squares[-1] if len(squares) > 0 else None
+        else:
+            last_move = squares[self.view_ply - 1] if 0 < self.view_ply <= len(squares) else None
+        if last_move is not None:
+            from_x, from_y, to_x, to_y = self.get_positions_by_square_turn(last_move)
+            result[square(from_x, from_y)] = "lightgreen"
+            result[square(to_x, to_y)] = "green"
+
+        if self.view_ply is None and (self.board_state == 1 or self.board_state == 2):
+            result[self.position.kings[self.position.turn]] = "darkred"
+        return result
+
+    def _dirty_rects(self, layers: tuple) -> list[pygame.Rect]:
+        if self._drawn_layers is None:
+            return [self.board.get_rect()]
+
+        old_highlights, old_pieces, old_overlay = self._drawn_layers
+        highlights, pieces, overlay = layers
+        rects = [pygame.Rect(square_x(sq) * self.rectDimension, square_y(sq) * self.rectDimension,
+                             self.rectDimension, self.rectDimension)
+                 for sq, _ in old_highlights ^ highlights]
+        rects += [pygame.Rect(rect) for _, rect in old_pieces ^ pieces]
+        if old_overlay != overlay:
+            rects += [pygame.Rect(rect) for _, rect in set(old_overlay) | set(overlay)]
+        return rects
+
+    def draw(self) -> list[pygame.Rect]:
+        """Redraw what changed since the last frame, returning the updated screen areas"""
+        if self.screen is None:
+            self.logger.error(f"Screen is not defined")
+            raise Exception("Screen is not defined")
 
-        pygame.draw.rect(self.board, "darkred", [(team_king.x * rect_dimension),
-                                                 (team_king.y * rect_dimension),
-                                                 rect_dimension, rect_dimension])
+        static = self.static_layer()
+        highlights = self.highlights()
+        pieces = self.pieces if self.view_ply is None else self.view_pieces
+        overlay = [sprite for piece in pieces if piece.is_selected for sprite in piece.possible_moves]
+
+        # Anything drawn is keyed by its image and place, the sprites of a refreshed square keep the cached image
+        layers = (frozenset(highlights.items()),
+                  frozenset((id(sprite.image), tuple(sprite.rect)) for sprite in pieces),
+                  tuple((id(sprite.image), tuple(sprite.rect)) for sprite in overlay))
+        dirty = self._dirty_rects(layers)
+        self._drawn_layers = layers
+
+        for rect in dirty:
+            self.board.set_clip(rect)
+            self.board.blit(static, rect, rect)
+            for sq, colour in highlights.items():
+                self.board.fill(colour, (square_x(sq) * self.rectDimension, square_y(sq) * self.rectDimension,
+                                         self.rectDimension, self.rectDimension))
+            pieces.draw(self.board)
+            for sprite in overlay:
+                self.board.blit(sprite.image, sprite.rect)
+            self.board.blit(self._notation_layer, rect, rect)
+        self.board.set_clip(None)
+
+        screen_rects = [rect.move(self.drawingPos) for rect in dirty]
+        for rect, screen_rect in zip(dirty, screen_rects):
+            self.screen.blit(self.board, screen_rect, rect)
+        return screen_rects
 
     def handle_event(self, event):
-        # proceed events
-        if event.type == pygame.MOUSEBUTTONDOWN:
+        # proceed events, the pieces of a browsed position cannot be moved
+        if event.type == pygame.MOUSEBUTTONDOWN and self.view_ply is None:
             pos = pygame.mouse.get_pos()
             rel_x, rel_y = pos[0] - self.drawingPos[0], pos[1] - self.drawingPos[1]
             self.handle_moving((rel_x, rel_y))
@@ -337,7 +476,6 @@ class Board(BaseService):
                 self.real_player_turn = json.loads(items[2])
                 self.logger.info(self.real_player_turn)
                 self.logger.info(self.is_white_turn)
-                self.compute_legal_move()
             case "pgn":
                 self.pgn = json.loads(items[1])
             case "square":
@@ -367,35 +505,111 @@ class Board(BaseService):
         turn_to_undo = 2 if self.is_ai else 1
         self.undo_turns(turn_to_undo)
 
+    def redo_turn_offline(self):
+        if self.is_online:
+            return
+
+        turn_to_redo = 2 if self.is_ai else 1
+        self.redo_turns(turn_to_redo)
+
     def undo_turns(self, turn_to_undo):
-        if turn_to_undo > len(self.fen_pos):
-            turn_to_undo = len(self.fen_pos)
-        if len(self.fen_pos) == 1:
+        turn_to_undo = min(turn_to_undo, len(self.fen_pos) - 1)
+        if turn_to_undo <= 0:
             return
-        self.pgn = self.pgn[:-turn_to_undo]
-        self.fen_pos = self.fen_pos[:-turn_to_undo]
-        self.squares = self.squares[:-turn_to_undo]
-        self.set_board_by_fen(self.fen_pos[-1])
         self.logger.info(f"Undoing {turn_to_undo} turn")
 
-    def draw(self):
+        # A board synced from FENs alone (online join) has no moves to take back
+        if turn_to_undo > len(self.position.move_stack):
+            self.pgn = self.pgn[:-turn_to_undo]
+            self.fen_pos = self.fen_pos[:-turn_to_undo]
+            self.squares = self.squares[:-turn_to_undo]
+            self.set_board_by_fen(self.fen_pos[-1])
+            return
 
-        if self.screen is None:
-            self.logger.error(f"Screen is not defined")
-            raise Exception("Screen is not defined")
+        squares = set()
+        for _ in range(turn_to_undo):
+            move = self.position.pop()
+            squares.update(changed_squares(move))
+            self.redo_stack.append((move, self.pgn.pop(), self.squares.pop(), self.fen_pos.pop()))
+        self.history.truncate(len(self.fen_pos) - 1)
+        self.sync_position(squares)
+
+    def redo_turns(self, turn_to_redo):
+        turn_to_redo = min(turn_to_redo, len(self.redo_stack))
+        if turn_to_redo == 0:
+            return
+        self.logger.info(f"Redoing {turn_to_redo} turn")
+
+        squares = set()
+        for _ in range(turn_to_redo):
+            move, pgn, square_name, fen = self.redo_stack.pop()
+            self.position.push(move)
+            self.history.append(move)
+            squares.update(changed_squares(move))
+            self.pgn.append(pgn)
+            self.squares.append(square_name)
+            self.fen_pos.append(fen)
+        self.sync_position(squares)
 
-        self.draw_board(self.rectDimension)
-        self.draw_turn(self.rectDimension)
-        self.draw_checked(self.rectDimension)
+    def sync_position(self, squares=range(64)):
+        """Bring the sprites, the engine and the turn flags up to date after the position moved through its stack"""
+        self.deselect_piece()
+        self.refresh_pieces(squares)
+        if self.is_ai:
+            self.stockfish.set_fen_position(self.fen_pos[-1])
 
-        self.handle_queue()
+        if self.is_online is False:
+            self.real_player_turn = self.is_white_turn
+        self.ai_turn = not self.is_white_turn
+        self.update_board_state()
 
-        self.pieces.draw(self.board)
-        self.pieces.update(screen=self.board)
+        if self.loaded_history is None and self.view_ply is not None and self.view_ply > self.history.last_ply:
+            self.view(None)
+        else:
+            self.update_info()
 
-        self.draw_notations()
+    @property
+    def browsed_history(self) -> GameHistory:
+        return self.history if self.loaded_history is None else self.loaded_history
+
+    def view(self, ply: int | None):
+        """Show the position after ply moves instead of the live game, None or the last ply goes back to it.
+        A loaded game has no live position, None shows its last ply"""
+        history = self.browsed_history
+        if ply is not None:
+            ply = max(ply, history.start_ply)
+        if self.loaded_history is not None:
+            ply = history.last_ply if ply is None else min(ply, history.last_ply)
+        elif ply is not None and ply >= history.last_ply:
+            ply = None
+        self.view_ply = ply
+        self.view_pieces.empty()
+        self.view_position = None
+
+        if self.view_ply is not None:
+            self.deselect_piece()
+            self.view_position = history.position_at(self.view_ply)
+            for sq, code in enumerate(self.view_position.board):
+                if code != EMPTY:
+                    self.view_pieces.add(self.create_piece_sprite(code, square_x(sq), square_y(sq)))
+        self.update_info()
+
+    def step_view(self, step: int):
+        self.view((self.browsed_history.last_ply if self.view_ply is None else self.view_ply) + step)
+
+    def update_info(self):
+        fen = self.fen_pos[-1] if self.view_position is None else self.view_position.fen()
+        self.handle_callback(self.set_fen_callback, fen)
+        self.handle_callback(self.set_pgn_callback, self.pgn if self.loaded_history is None else self.loaded_pgn,
+                             self.view_ply)
+
+    def deselect_piece(self):
+        if self.selectedPiece is None:
+            return
 
-        self.screen.blit(self.board, self.drawingPos)
+        self.selectedPiece.is_selected = False
+        self.selectedPiece.possible_moves.empty()
+        self.selectedPiece = None
 
     def handle_moving(self, pos: tuple[int, int]):
         clicked_sprites = [s for s in self.pieces if s.rect.collidepoint(pos)]
@@ -416,16 +630,36 @@ class Board(BaseService):
         self.selectedPiece = piece
         # self.logger.info(f"Selected Piece: {piece} at {piece.x} and {piece.y}")
         self.selectedPiece.is_selected = True
+        self.show_legal_moves(piece)
 
         # if self.is_white_turn != piece.is_white:
         #     self.make_turn((piece.x, piece.y))
         #     return
 
-    def compute_legal_move(self):
-        self._compute_all_moves()
-        self.filter_invalid_moves()
-        # self.best_move = self.stockfish.get_best_move()
-        # self.logger.info(f"Best move: {self.best_move}")
+    @property
+    def legal_moves(self) -> array:
+        if self._legal_moves_key != self.position.key:
+            self._legal_moves = self.position.legal_moves()
+            self._legal_moves_key = self.position.key
+            self._moves_by_square = None
+        return self._legal_moves
+
+    def legal_moves_from(self, sq: int) -> list[int]:
+        moves = self.legal_moves
+        if self._moves_by_square is None:
+            self._moves_by_square = {}
+            for move in moves:
+                self._moves_by_square.setdefault(move_from(move), []).append(move)
+        return self._moves_by_square.get(sq, [])
+
+    def show_legal_moves(self, piece: Piece):
+        """Markers are only built for the selected piece"""
+        piece.possible_moves.empty()
+        for move in self.legal_moves_from(square(piece.x, piece.y)):
+            # Promotions share one marker per destination
+            if move_promotion(move) in (EMPTY, QUEEN):
+                to_sq = move_to(move)
+                piece.possible_moves.add(GreenDot(square_x(to_sq), square_y(to_sq), size=self.rectDimension))
 
     def to_pgn(self):
         result = ""
@@ -439,83 +673,26 @@ class Board(BaseService):
         self.best_move = return_value
         self.logger.info(f"Best move: {self.best_move}")
 
-    def is_draw_by_repetition(self):
-        if len(self.fen_pos) < 2:
-            return
-
-        all_fen_board: list[str] = list(map(lambda i: " ".join(i.split()[:-2]), self.fen_pos))
-
-        current_fen_board = all_fen_board[-1]
-        current_occurrences = all_fen_board.count(current_fen_board)
-
-        return current_occurrences > 2
-
     def update_board_state(self):
-        black_king, white_king = self.get_black_and_white_king()
-        team_king = white_king if self.is_white_turn else black_king
-        opponents = [p for p in self.pieces if p.is_white != self.is_white_turn]
-        teams = [p for p in self.pieces if p.is_white == self.is_white_turn]
-
-        is_check = self.is_check(opponents, team_king)
-
-        if is_check:
-            self.board_state = 2 if Board.is_no_possible_move(teams) else 1
-
-        else:
-            self.board_state = 5 if Board.is_no_possible_move(teams) else 0
-
-        if len(self.pieces) == 2:
-            self.board_state = 8
-
-        if len(self.pieces) == 3:
-            for p in self.pieces:
-                if isinstance(p, Knight) or isinstance(p, Bishop):
-                    self.board_state = 8
-
-        if self.half_clock == 50:
-            self.board_state = 6
-
-        if self.is_draw_by_repetition():
-            self.board_state = 7
-
-        if self.board_state == 2:
-            self.board_state = 2 if self.is_white_turn else 3
-
-    @staticmethod
-    def is_check(opponents: list[Piece], team_king: King):
-        for opponent in opponents:
-            check_moves = [move for move in opponent.possible_moves if move.x == team_king.x and move.y == team_king.y]
-            if len(check_moves) > 0:
-                return True
-        return False
-
-    @staticmethod
-    def is_no_possible_move(teams: list[Piece]):
-        for team in teams:
-            if len(team.possible_moves) > 0:
-                return False
-
-        return True
+        # Online games end only by the rules, both sides have to agree on that, and against the AI the endgame
+        # is played out with its tablebase moves
+        adjudicate = self.setting.tablebase_adjudication and not self.is_online and not self.is_ai
+        self.board_state = board_state(self.position, self.tablebase if adjudicate else None)
 
     def next_turn(self):
-        self.moves += 1
-        self.is_white_turn = not self.is_white_turn
         if self.is_ai and self.is_white_turn == self.ai_turn:
             self.make_turn_by_stockfish()
 
         if not self.is_ai and not self.is_online:
             self.real_player_turn = self.is_white_turn
-        self.compute_legal_move()
 
         self.fen_pos.append(self.get_current_fen())
         self.update_board_state()
         self.update_pgn_state()
 
-        pgn = self.to_pgn()
         self.logger.info(f"FEN: {self.fen_pos}")
-        self.logger.info(f"PGN: {pgn}")
-        self.handle_callback(self.set_fen_callback, self.fen_pos[-1])
-        self.handle_callback(self.set_pgn_callback, self.to_pgn())
+        self.logger.info(f"PGN: {self.to_pgn()}")
+        self.update_info()
 
         self.play_sound()
 
@@ -542,166 +719,116 @@ class Board(BaseService):
         if self.selectedPiece is None:
             return
 
-        extra = ""
-        clicked_sprites = []
-
         if isinstance(self.selectedPiece, Pawn) and self.selectedPiece.is_promoting:
             clicked_sprites = [s for s in self.selectedPiece.possible_moves if s.rect.collidepoint(pos)
                                and isinstance(s, Piece)]
-
-            if len(clicked_sprites) != 0:
-                piece = clicked_sprites[0]
-                extra = piece.shortName
-            else:
+            if len(clicked_sprites) == 0:
                 return
-        else:
-            clicked_sprites = [s for s in self.selectedPiece.possible_moves if s.hidden_rect.collidepoint(pos)]
 
-        if len(clicked_sprites) > 0:
-            self.logger.info(f"Move to pos: {clicked_sprites[0].x}, {clicked_sprites[0].y}")
-            self.make_turn((clicked_sprites[0].x, clicked_sprites[0].y), False, extra)
-            if isinstance(self.selectedPiece, Pawn):
-                if self.selectedPiece.is_promoting:
-                    self.selectedPiece.is_selected = True
-                    return
-            self.next_turn()
+            pawn = self.selectedPiece
+            if self.make_turn((pawn.next_x, pawn.next_y), clicked_sprites[0].shortName):
+                self.next_turn()
+            return
 
-        else:
-            self.selectedPiece.is_selected = False
-            self.selectedPiece = None
-            self.logger.info(f"Click none")
+        clicked_sprites = [s for s in self.selectedPiece.possible_moves if s.hidden_rect.collidepoint(pos)]
 
-    def _handle_en_passant(self, pawn: Pawn, dest: tuple[int, int]):
-        if self.coordinate[dest[0], dest[1]] is not None:
-            return None
+        if len(clicked_sprites) > 0:
+            x, y = clicked_sprites[0].x, clicked_sprites[0].y
+            self.logger.info(f"Move to pos: {x}, {y}")
+            if isinstance(self.selectedPiece, Pawn) and (y == 7 or y == 0):
+                self.selectedPiece.start_promotion(x, y)
+                return
 
-        check_pos = 2 if pawn.is_white else 5
-        adder = 1 if pawn.is_white else -1
-        if dest[1] != check_pos:
-            return
+            if self.make_turn((x, y)):
+                self.next_turn()
 
-        x, y = dest[0], dest[1] + adder
-        item = self.coordinate[x][y]
-        if isinstance(item, Pawn) and item.is_white != pawn.is_white and item.is_first_move:
-            self.coordinate[x][y] = None
-            self.pieces.remove(item)
-            return item
-        return None
-
-    def _handle_castle(self, from_piece: King, x, y, test_mode=False):
-        q, k = from_piece.can_castle_queen, from_piece.can_castle_king
-
-        x_distance = from_piece.x - x
-        rook_pos = x + 1 if x_distance == 2 else x - 1
-        if abs(x_distance) == 2:
-            rook = self.coordinate[0, y] if rook_pos == 3 else self.coordinate[7, y]
-            self.selectedPiece = rook
-            self.make_turn((rook_pos, y), True)
-            self.selectedPiece = from_piece
-            from_piece.can_castle_queen = False
-            from_piece.can_castle_king = False
-
-        if test_mode:
-            from_piece.can_castle_queen, from_piece.can_castle_king = q, k
-
-    def make_turn(self, dest: tuple[int, int], test_mode=False, extra="", by_square=False) -> None | Piece:
-        x, y = dest[0], dest[1]
+        else:
+            self.deselect_piece()
+            self.logger.info(f"Click none")
 
+    def make_turn(self, dest: tuple[int, int], extra="") -> bool:
+        """Play the selected piece to dest, False when that is not a legal move"""
         from_piece = self.selectedPiece
-        dest_item = self.coordinate[x, y]
 
         from_piece.is_selected = False
+        from_piece.possible_moves.empty()
         self.selectedPiece = None
 
-        (from_x, from_y) = from_piece.x, from_piece.y
-        if (from_x, from_y) == (x, y):
-            return None
+        from_sq, to_sq = square(from_piece.x, from_piece.y), square(dest[0], dest[1])
+        if from_sq == to_sq:
+            return False
 
-        self.coordinate[from_x, from_y] = None
+        move = find_move(self.legal_moves_from(from_sq), from_sq, to_sq, Board.promotion_types.get(extra, EMPTY))
+        if move == NULL_MOVE:
+            self.logger.error(f"Illegal move from {from_piece.x, from_piece.y} to {dest} {extra}")
+            return False
 
-        if isinstance(from_piece, Pawn):
-            if not test_mode and extra == "" and (y == 7 or y == 0):
-                from_piece.is_promoting = True
-                from_piece.compute_possible_moves(self.coordinate)
-                self.selectedPiece = from_piece
-                test_mode = True
-            else:
-                from_piece.is_promoting = False
+        pgn = self.create_pgn_turn(move)
 
-            dest_item = self._handle_en_passant(from_piece, dest)
-            dest_item = self.coordinate[x, y] if dest_item is None else dest_item
+        square_name = self.create_square_name(move)
+        self.squares.append(square_name)
+        self.logger.info(f"Square name: {square_name}")
 
-        if isinstance(from_piece, King):
-            if from_piece.x == 4:
-                self._handle_castle(from_piece, x, y, test_mode)
+        if self.is_ai:
+            self.stockfish.make_move(square_name)
 
-        if not test_mode:
-            pgn = self.create_pgn_turn(from_piece, dest, dest_item, by_square, extra)
+        if self.is_online and self.real_player_turn == self.is_white_turn:
+            self.socket_service.send(f"p|{square_name}")
 
-            square_name = self.create_square_name(from_piece, dest, by_square, extra)
-            self.squares.append(square_name)
-            self.logger.info(f"Square name: {square_name}")
+        self.pgn.append(pgn)
 
-            if self.is_ai:
-                self.stockfish.make_move(square_name)
+        self.position.push(move)
+        self.history.append(move)
+        self.redo_stack.clear()
 
-            if self.is_online and self.real_player_turn == self.is_white_turn:
-                self.socket_service.send(f"p|{square_name}")
+        captured = self.coordinate[dest[0], dest[1]]
+        if captured is not None:
+            self.pieces.remove(captured)
+        self.coordinate[from_piece.x, from_piece.y] = None
+        self.coordinate[dest[0], dest[1]] = from_piece
+        from_piece.move(dest[0], dest[1])
 
-            self.pgn.append(pgn)
+        # En passant, castling rook and promotion
+        self.refresh_pieces(changed_squares(move))
+        return True
 
-            # self.logger.info(f"PGN: {self.pgn}")
-            # self.logger.info(f"Long PGN: {square_name}")
-
-        if extra != "" and isinstance(from_piece, Pawn):
-            i_x, i_y, is_white = from_piece.next_x, from_piece.next_y, from_piece.is_white
-            if by_square:
-                i_x, i_y = x, y
-
-            x, y = i_x, i_y
-            match extra:
-                case "Q":
-                    self.set_piece(Queen(is_white, i_x, i_y))
-                case "R":
-                    self.set_piece(Rook(is_white, i_x, i_y))
-                case "B":
-                    self.set_piece(Bishop(is_white, i_x, i_y))
-                case "N":
-                    self.set_piece(Knight(is_white, i_x, i_y))
-            self.pieces.remove(from_piece)
-            self.half_clock = 0
-            return from_piece
-
-        elif isinstance(from_piece, Pawn) and from_piece.is_promoting:
-            from_piece.move(x, y)
+    def open_book(self, path: str) -> PolyglotBook | None:
+        if not os.path.isfile(path):
+            self.logger.info(f"No opening book at {path}")
             return None
-        else:
-            from_piece.move(x, y)
 
-        self.coordinate[x, y] = from_piece
-
-        if dest_item is not None:
-            if not test_mode:
-                self.half_clock = 0
+        try:
+            book = PolyglotBook(path)
+        except (OSError, ValueError) as ex:
+            self.logger.warning(f"Cannot open opening book {path}: {ex}")
+            return None
+        self.logger.info(f"Opening book {path}: {len(book)} entries")
+        return book
 
-            self.pieces.remove(dest_item)
+    def open_tablebase(self, path: str) -> Tablebase | None:
+        tablebase = open_tablebase(path)
+        if tablebase is None:
+            self.logger.info(f"No Syzygy tablebases at {path}")
         else:
-            if test_mode:
-                return dest_item
-            if isinstance(from_piece, Pawn):
-                self.half_clock = 0
-            else:
-                self.half_clock += 1
-
-        #         Play capture sound
-
-        #    Play move sound
-
-        return dest_item
+            self.logger.info(f"Syzygy tablebases {path}: up to {tablebase.max_pieces} pieces")
+        return tablebase
 
     def make_turn_by_stockfish(self):
         def callback(pgn):
             self.deque.append(f"ai|{pgn}")
+            self.handle_callback(self.message_callback)
+
+        book_move = self.book.choose(self.position) if self.book is not None else NULL_MOVE
+        if book_move != NULL_MOVE:
+            self.logger.info(f"Book move: {move_to_uci(book_move)}")
+            callback(move_to_uci(book_move))
+            return
+
+        tablebase_move = self.tablebase.best_move(self.position) if self.tablebase is not None else NULL_MOVE
+        if tablebase_move != NULL_MOVE:
+            self.logger.info(f"Tablebase move: {move_to_uci(tablebase_move)}")
+            callback(move_to_uci(tablebase_move))
+            return
 
         self.stockfish.get_best_move(callback)
 
@@ -723,271 +850,24 @@ class Board(BaseService):
         self.logger.info(f"Moves: {from_x, from_y, to_x, to_y, extra}")
 
         item = self.coordinate[from_x][from_y]
+        # A stale engine reply or a desynchronised opponent can name an empty square
+        if item is None:
+            self.logger.error(f"No piece to move for {notation}")
+            return
+
+        self.deselect_piece()
         self.selectedPiece = item
         self.logger.info(f"PGN: {self.pgn}")
         self.logger.info(f"{from_x}, {from_y}, {to_x}, {to_y}, selectedPiece: {self.selectedPiece}")
-        self.make_turn((to_x, to_y), False, extra.upper(), True)
-        self.next_turn()
-
-    def create_pgn_turn(self, piece: Piece, dest: tuple[int, int], capture=None, by_square=False, extra="") -> str:
-        x, y = dest[0], dest[1]
-        adder = ""
-
-        if isinstance(piece, King):
-            dist = piece.x - dest[0]
-            if dist == 2:
-                return "O-O-O"
-            elif dist == -2:
-                return "O-O"
-
-        if capture is None:
-            capture = self.coordinate[x][y]
-
-        if isinstance(piece, Rook) or isinstance(piece, Knight):
-            adder += self.pgn_for_pairs(piece, dest)
-
-        if capture is not None:
-            if isinstance(piece, Pawn):
-                adder += Board.row_notation[piece.x]
-            adder += "x"
-
-        pos = Board.row_notation[x] + Board.col_notation[y]
-
-        if isinstance(piece, Pawn) and (piece.y == 1 or piece.y == 6) and not by_square:
-            pos = Board.row_notation[piece.next_x] + Board.col_notation[piece.next_y]
-            if adder == "":
-                capture = self.coordinate[piece.next_x, piece.next_y]
-                if capture is not None:
-                    adder += Board.row_notation[piece.x]
-                    adder += "x"
-        if extra != "":
-            extra = "=" + extra
-
-        return piece.shortName + adder + pos + extra
-
-    def create_square_name(self, piece: Piece, dest: tuple[int, int], by_square_notation: bool, extra=""):
-        x, y = dest[0], dest[1]
-
-        long = Board.row_notation[piece.x] + Board.col_notation[piece.y]
-
-        pos = Board.row_notation[x] + Board.col_notation[y]
-        if extra != "" and not by_square_notation:
-            long = Board.row_notation[piece.x] + Board.col_notation[piece.y]
-            pos = Board.row_notation[piece.next_x] + Board.col_notation[piece.next_y]
-
-        return long + pos + extra.lower()
-
-    def pgn_for_pairs(self, piece: Piece, dest: tuple[int, int]) -> str:
-        x, y = dest[0], dest[1]
-        another = [p for p in self.pieces if type(p) == type(piece) and p.is_white == piece.is_white and p != piece]
-        if len(another) == 0:
-            return ""
-        other = another[0]
-        if not isinstance(other, Piece):
-            self.logger.error(f"{other} is not a Piece")
-            raise ValueError(f"{other} is not a Piece")
-
-        can_other_move_to_dest = [move for move in other.possible_moves if move.x == x and move.y == y]
-        self.logger.info(can_other_move_to_dest)
-        return Board.row_notation[piece.x] if len(can_other_move_to_dest) > 0 else ""
-
-    def handle_king(self, piece: Piece, x, y):
-        if not isinstance(piece, King):
-            return
-
-        x_distance = piece.x - x
-        if abs(x_distance) != 2:
-            return
-
-        rook_pos = x - 1 if piece.x == 2 else x + 1
-
-        rook = self.coordinate[rook_pos, piece.y]
-        self.selectedPiece = rook
-        if x_distance == 2:
-            self.make_turn((7, y), True)
-        elif x_distance == -2:
-            self.make_turn((0, y), True)
-
-        self.selectedPiece = piece
-
-    def filter_invalid_moves(self) -> None:
-        black_king, white_king = self.get_black_and_white_king()
-        team_king = white_king if self.is_white_turn else black_king
-        opponents = [p for p in self.pieces if p.is_white != self.is_white_turn]
-        teams = [p for p in self.pieces if p.is_white == self.is_white_turn]
-
-        illegal_move_dict = {}
-
-        for piece in teams:
-            if not isinstance(piece, Piece):
-                self.logger.info(f"Invalid piece type: {piece}")
-                raise ValueError(f"Invalid piece type: {piece}")
-
-            x, y = piece.x, piece.y
-
-            for move in piece.possible_moves:
-
-                cloned_piece = piece.clone()
-                b_king, w_king = black_king.clone(), white_king.clone()
-
-                self.selectedPiece = piece
-                remove_piece = self.make_turn((move.x, move.y), True)
-
-                if remove_piece is not None:
-                    remove_piece.possible_moves.empty()
-
-                self._compute_all_moves()
-                illegal_moves = []
-                for opponent_piece in opponents:
-                    inner_illegal_moves = [move for move in opponent_piece.possible_moves if move.x == team_king.x
-                                           and move.y == team_king.y]
-                    if isinstance(piece, King) and (cloned_piece.can_castle_queen or cloned_piece.can_castle_king):
-                        inner_illegal_moves += self._filter_illegal_castling(piece, opponent_piece)
-
-                    if len(inner_illegal_moves) > 0:
-                        illegal_moves.append(move)
-                        break
-
-                # Undo
-                self.coordinate[piece.x, piece.y] = None
-
-                if isinstance(piece, King):
-                    self.handle_king(piece, x, y)
-
-                black_king.clone_from(b_king)
-                white_king.clone_from(w_king)
-
-                piece.clone_from(cloned_piece)
-                self.coordinate[piece.x, piece.y] = piece
-                # self.make_turn((x, y), True)
-
-                if remove_piece is not None:
-                    self.set_piece(remove_piece)
-                self._compute_all_moves()
-
-                # Add to remove list
-                if illegal_move_dict.get((x, y)) is None:
-                    illegal_move_dict[(x, y)] = []
-
-                illegal_move_dict[(x, y)] += illegal_moves
-
-        for piece in teams:
-            x, y = piece.x, piece.y
-            # self.logger.info(illegal_move_dict)
-            # self.logger.info(piece)
-            # self.logger.info([(p.x, p.y) for p in [p for p in piece.possible_moves]])
-            possible = filter(lambda possible_move: self._compare(possible_move, illegal_move_dict[(x, y)]),
-                              piece.possible_moves)
-            # [move for move in piece.possible_moves if move not in illegal_move_dict[piece]]
-            piece.possible_moves.empty()
-            [piece.possible_moves.add(move) for move in possible]
-
-    @staticmethod
-    def _filter_illegal_castling(king_piece: King, opponent_piece: Piece):
-        illegal_moves = []
-        if king_piece.x == 6:
-            illegal_moves += [move for move in opponent_piece.possible_moves if (4 <= move.x <= 6)
-                              and move.y == king_piece.y]
-        if king_piece.x == 2:
-            illegal_moves += [move for move in opponent_piece.possible_moves if (2 <= move.x <= 4)
-                              and move.y == king_piece.y]
-        return illegal_moves
-
-    def _compare(self, move, illegal_moves):
-        for illegal_move in illegal_moves:
-            if move.x != illegal_move.x or move.y != illegal_move.y:
-                continue
-            return False
-        return True
-
-    def get_black_and_white_king(self):
-        white_king: King
-        black_king: King
-        for piece in self.pieces:
-            if not isinstance(piece, King):
-                continue
-
-            if piece.is_white:
-                white_king = piece
-            else:
-                black_king = piece
-
-        return black_king, white_king
-
-    def get_current_fen_pieces(self) -> list[str]:
-        fen_piece = []
-        for i in range(8):
-            count = 0
-            fen_slice = ''
-            for j in range(8):
-                item = self.coordinate[j, i]
-                if item is None:
-                    count += 1
-                    continue
-
-                if count > 0:
-                    fen_slice += str(count)
-                count = 0
-
-                if not isinstance(item, Piece):
-                    raise ValueError("WTF")
-
-                fen_slice += item.shortName if item.is_white else item.shortName.lower()
-                if isinstance(item, Pawn):
-                    fen_slice += "P" if item.is_white else "p"
-
-            if count > 0:
-                fen_slice += str(count)
-
-            fen_piece.append(fen_slice)
-        return fen_piece
-
-    def get_current_fen_castle(self):
-        kings = self.get_black_and_white_king()
-        fen_castle = []
-
-        for king in kings[::-1]:
-            if king.can_castle_king:
-                fen_castle.append('K' if king.is_white else 'k')
-            if king.can_castle_queen:
-                fen_castle.append('Q' if king.is_white else 'q')
-        return fen_castle if len(fen_castle) > 0 else ['-']
-
-    def __inner_en_passant(self, y):
-        notation_y = "6" if y == 3 else "3"
-
-        for i in range(8):
-            item = self.coordinate[i, y]
-            if not isinstance(item, Pawn):
-                continue
+        if self.make_turn((to_x, to_y), extra.upper()):
+            self.next_turn()
 
-            if not item.is_first_move:
-                continue
+    def create_pgn_turn(self, move: int) -> str:
+        # Check marks are added by update_pgn_state once the board state is known
+        return move_to_san(self.position, move, self.legal_moves, suffix=False)
 
-            left = item.x - 1
-            if left >= 0:
-                left_item = self.coordinate[left, y]
-                if isinstance(left_item, Pawn) and left_item.is_white != item.is_white:
-                    have_en_passant_move = [move for move in left_item.possible_moves if move.x + 1 == item.x
-                                            and (move.y == y - 1 or move.y == y + 1)]
-                    if len(have_en_passant_move) > 0:
-                        return Board.row_notation[item.x] + notation_y
-
-            right = item.x + 1
-            if right < 8:
-                right_item = self.coordinate[right, y]
-                if isinstance(right_item, Pawn) and right_item.is_white != item.is_white:
-                    have_en_passant_move = [move for move in right_item.possible_moves if move.x - 1 == item.x
-                                            and (move.y == y - 1 or move.y == y + 1)]
-                    if len(have_en_passant_move) > 0:
-                        return Board.row_notation[item.x] + notation_y
-        return "-"
-
-    def get_fen_en_passant(self):
-        return self.__inner_en_passant(3) if self._is_white_turn else self.__inner_en_passant(4)
+    def create_square_name(self, move: int) -> str:
+        return move_to_uci(move)
 
     def get_current_fen(self) -> str:
-        fen_piece = self.get_current_fen_pieces()
-        fen_castle = self.get_current_fen_castle()
-        fen_en_passant = self.get_fen_en_passant()
-        return f"{'/'.join(fen_piece)} {'w' if self._is_white_turn else 'b'} {''.join(fen_castle)} {fen_en_passant} {self.half_clock} {math.ceil(self.moves / 2)}"
+        return self.position.fen()
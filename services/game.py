@@ -1,3 +1,4 @@
+import time
 from enum import Enum
 
 import requests
@@ -10,12 +11,19 @@ from components.main_menu import MainMenu
 from components.room_menu import RoomMenu
 from services.base_service import BaseService
 from services.board import Board
+from services.profiler import FrameProfiler
 from components.game_over_dialog import GameOverDialog
 from services.setting import Setting
 from services.socket_service import SocketService
 from services.stockfish_service import Stockfish
 
 
+# Posted from the network and engine threads to wake the loop when a message is queued
+MESSAGE_EVENT = pygame.event.custom_type()
+# Seconds the loop keeps the full frame rate after an event, for hover highlights and UI transitions
+ACTIVE_AFTER_EVENT = 0.5
+
+
 class EScene(Enum):
     MAIN_MENU = 0
     ONLINE_SELECTION = 1
@@ -42,7 +50,7 @@ class Game(BaseService):
         self.board = board
         self.run = False
 
-        Game.screen = pygame.display.set_mode([setting.WIDTH, setting.HEIGHT])
+        Game.screen = pygame.display.set_mode([setting.WIDTH, setting.HEIGHT], pygame.RESIZABLE)
 
         self.board.screen = Game.screen
 
@@ -51,6 +59,10 @@ class Game(BaseService):
         self.clock = pygame.time.Clock()
 
         self.game_scenes = EScene.MAIN_MENU
+        # Scene on the screen and whether the game over dialog covers the board, both need a full redraw to leave
+        self.drawn_scene: EScene | None = None
+        self.game_over_shown = False
+        self.last_event_time = 0.0
 
         self.play_online = True
         self.board.play_online = self.play_online
@@ -58,6 +70,7 @@ class Game(BaseService):
         self.game_over_dialog.on_restart_clicked(self.board.reset_board)
 
         self.chat_gui = ChatGUI(setting, socket_service)
+        self.profiler = FrameProfiler(setting)
 
         self.setup_callback()
 
@@ -71,6 +84,9 @@ class Game(BaseService):
 
         self.chat_gui.forfeit_offline_callback = self.handle_forfeit_offline
         self.chat_gui.undo_callback = self.handle_undo_offline
+        self.chat_gui.redo_callback = self.handle_redo_offline
+        self.chat_gui.load_callback = self.board.browse_file
+        self.chat_gui.live_callback = self.board.close_loaded_game
 
         self.room_menu.to_board_callback = self.to_board
         self.room_menu.to_main_menu_callback = self.to_main_menu
@@ -78,8 +94,14 @@ class Game(BaseService):
         self.game_over_dialog.return_callback = self.to_main_menu
         self.socket_service.on_receive(self.board.handle_socket_message)
 
+        # Registered last, the message is in every queue by the time the loop wakes up
+        self.socket_service.on_receive(lambda msg: self.wake())
+        self.board.message_callback = self.wake
+
         self.board.set_fen_callback = self.board_info.set_fen_text
-        self.board.set_pgn_callback = self.board_info.set_pgn_text
+        self.board.set_pgn_callback = self.board_info.set_pgn_moves
+        self.board_info.seek_callback = self.board.view
+        self.board_info.step_callback = self.board.step_view
 
     def to_board(self):
         self.game_scenes = EScene.BOARD
@@ -99,6 +121,9 @@ class Game(BaseService):
     def handle_undo_offline(self):
         self.board.undo_turn_offline()
 
+    def handle_redo_offline(self):
+        self.board.redo_turn_offline()
+
     def handle_callback_offline(self):
         self.logger.info('Clicked Offline')
         self.board.is_online = False
@@ -152,41 +177,96 @@ class Game(BaseService):
         response = requests.get(url, headers=headers, params=querystring)
         return response.json()['puzzles'][0]['fen']
 
+    @staticmethod
+    def wake():
+        pygame.event.post(pygame.event.Event(MESSAGE_EVENT))
+
+    def is_active(self) -> bool:
+        """Whether the next frame may look different without any new event"""
+        return (self.game_scenes != self.drawn_scene
+                or time.perf_counter() - self.last_event_time < ACTIVE_AFTER_EVENT
+                or len(self.board.deque) > 0 or len(self.chat_gui.deque) > 0 or len(self.room_menu.deque) > 0)
+
+    def wait_events(self) -> list[pygame.event.Event]:
+        """Events of the frame, sleeping up to an idle frame for the first one when nothing is going on"""
+        events = []
+        if not self.is_active():
+            # An idle_FPS of 0 sleeps until an event, incoming messages wake the loop anyway
+            idle_FPS = self.setting.idle_FPS
+            event = pygame.event.wait(int(1000 / idle_FPS)) if idle_FPS > 0 else pygame.event.wait()
+            if event.type != pygame.NOEVENT:
+                events.append(event)
+        events += pygame.event.get()
+        if events:
+            self.last_event_time = time.perf_counter()
+        return events
+
     def start(self):
         pygame.init()
         pygame.display.set_icon(self.icon)
         pygame.display.set_caption('PyChess')
         self.run = True
         while self.run:
-            time_delta = self.clock.tick(self.setting.FPS) / 1000.0
+            with self.profiler.phase("wait"):
+                events = self.wait_events()
+                time_delta = self.clock.tick(self.setting.FPS) / 1000.0
 
             # event handling
-            events = pygame.event.get()
-            for event in events:
-                if event.type == pygame.QUIT:
-                    self.logger.info('Game quit')
-                    self.socket_service.disconnect()
-                    exit()
-
-                match self.game_scenes:
-                    case EScene.BOARD:
-                        self.handle_board_event(event)
-                    case EScene.MAIN_MENU:
-                        self.main_menu.process_events(event)
-                    case EScene.ONLINE_SELECTION:
-                        self.room_menu.process_events(event)
-
+            with self.profiler.phase("events"):
+                for event in events:
+                    if event.type == pygame.QUIT:
+                        self.logger.info('Game quit')
+                        if self.profiler.count > 0:
+                            self.profiler.dump()
+                        self.socket_service.disconnect()
+                        exit()
+
+                    if event.type == pygame.VIDEORESIZE:
+                        self.resize(event.size)
+
+                    self.profiler.process_events(event)
+                    match self.game_scenes:
+                        case EScene.BOARD:
+                            self.handle_board_event(event)
+                        case EScene.MAIN_MENU:
+                            self.main_menu.process_events(event)
+                        case EScene.ONLINE_SELECTION:
+                            self.room_menu.process_events(event)
+
+            scene_changed = self.game_scenes != self.drawn_scene
+            if scene_changed:
+                self.board.invalidate()
+
+            rects = None
             match self.game_scenes:
                 case EScene.BOARD:
-                    self.handle_board(time_delta)
+                    rects = self.handle_board(time_delta)
                 case EScene.MAIN_MENU:
-                    self.main_menu.update(time_delta)
-                    self.main_menu.draw(self.screen)
+                    with self.profiler.phase("menus"):
+                        self.main_menu.update(time_delta)
+                        self.main_menu.draw(self.screen)
                 case EScene.ONLINE_SELECTION:
-                    self.room_menu.update(time_delta)
-                    self.room_menu.draw(self.screen)
-
-            pygame.display.flip()
+                    with self.profiler.phase("menus"):
+                        self.room_menu.update(time_delta)
+                        self.room_menu.draw(self.screen)
+
+            overlay = self.profiler.draw(self.screen)
+            with self.profiler.phase("display"):
+                if scene_changed or rects is None:
+                    pygame.display.flip()
+                else:
+                    pygame.display.update(rects + [overlay] if overlay else rects)
+            self.drawn_scene = self.game_scenes
+            self.profiler.end_frame()
+
+    def resize(self, size: tuple[int, int]):
+        Game.screen = pygame.display.get_surface()
+        self.board.screen = Game.screen
+        for ui in (self.main_menu, self.room_menu, self.chat_gui, self.board_info, self.game_over_dialog):
+            ui.manager.set_window_resolution(size)
+        # Everything moved, the next frame flips the whole display
+        self.drawn_scene = None
+        self.logger.info(f"Resized to {size}, squares of {self.board.rectDimension}px")
 
     def handle_board_event(self, event):
         if event.type == pygame.MOUSEBUTTONDOWN:
@@ -198,8 +278,18 @@ class Game(BaseService):
         if self.board.board_state > 1:
             self.game_over_dialog.process_events(event)
 
-    def handle_board(self, time_delta):
-        self.board.draw()
+    def handle_board(self, time_delta) -> list[pygame.Rect]:
+        """Draw the board scene, returning the screen areas that changed"""
+        game_over = self.board.board_state > 1
+        if game_over != self.game_over_shown:
+            self.board.invalidate()
+            self.game_over_shown = game_over
+
+        with self.profiler.phase("queue"):
+            self.board.handle_queue()
+        with self.profiler.phase("board"):
+            rects = self.board.draw()
+
         if self.board.board_state > 1:
             match self.board.board_state:
                 case 2:
@@ -216,12 +306,25 @@ class Game(BaseService):
                     self.game_over_dialog.info_label.set_text("Draw - Three-fold Repetition")
                 case 8:
                     self.game_over_dialog.info_label.set_text("Draw - Insufficient Pieces")
-
-            self.game_over_dialog.update(time_delta)
-            self.game_over_dialog.draw(self.screen)
-
-        self.chat_gui.update(time_delta)
-        self.chat_gui.draw(self.screen)
-
-        self.board_info.update(time_delta)
-        self.board_info.draw(self.screen)
+                case 9:
+                    self.game_over_dialog.info_label.set_text("White win - Tablebase")
+                case 10:
+                    self.game_over_dialog.info_label.set_text("Black win - Tablebase")
+                case 11:
+                    self.game_over_dialog.info_label.set_text("Draw - Tablebase")
+
+            with self.profiler.phase("game_over"):
+                self.game_over_dialog.update(time_delta)
+                self.game_over_dialog.draw(self.screen)
+            rects.append(self.game_over_dialog.panel.rect)
+
+        with self.profiler.phase("chat"):
+            self.chat_gui.update(time_delta)
+            self.chat_gui.draw(self.screen)
+
+        with self.profiler.phase("board_info"):
+            self.board_info.update(time_delta)
+            self.board_info.draw(self.screen)
+
+        rects += [self.chat_gui.panel.rect, self.board_info.panel.rect]
+        return rects
@@ -0,0 +1,117 @@
+import contextlib
+import csv
+import json
+import time
+
+import numpy as np
+import pygame
+
+from components.image_cache import filled_image, font
+from services.base_service import BaseService
+from services.setting import Setting
+
+# Every phase of a frame, "frame" is the sum of the others without the idle wait
+PHASES = ("wait", "events", "queue", "board", "game_over", "chat", "board_info", "menus", "display", "frame")
+FRAME = PHASES.index("frame")
+WAIT = PHASES.index("wait")
+OVERLAY_FONT = './assets/fonts/Roboto-Regular.ttf'
+# Frames between two renders of the overlay text
+OVERLAY_REFRESH = 15
+
+
+class FrameProfiler(BaseService):
+    """Per-phase frame times in a ring buffer, with an overlay (F3) and a CSV or JSON dump (F4)"""
+
+    def __init__(self, setting: Setting):
+        super().__init__()
+        self.enabled = setting.profile
+        self.path = setting.profile_path
+        self.times = np.zeros((setting.profile_frames, len(PHASES)))
+        self.count = 0
+        self._current = [0.0] * len(PHASES)
+        self._overlay: pygame.Surface | None = None
+
+    @contextlib.contextmanager
+    def _timed(self, index: int):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._current[index] += time.perf_counter() - start
+
+    def phase(self, name: str):
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self._timed(PHASES.index(name))
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+
+        self._current[FRAME] = sum(self._current) - self._current[WAIT]
+        self.times[self.count % len(self.times)] = self._current
+        self.count += 1
+        self._current = [0.0] * len(PHASES)
+
+    def recorded(self) -> np.ndarray:
+        """Frame times in seconds, oldest first"""
+        size = len(self.times)
+        if self.count <= size:
+            return self.times[:self.count]
+        return np.roll(self.times, -(self.count % size), axis=0)
+
+    def percentiles(self) -> dict[str, tuple[float, float]]:
+        """p50 and p99 of every phase in milliseconds"""
+        times = self.recorded()
+        if len(times) == 0:
+            return {}
+        p50, p99 = np.percentile(times, (50, 99), axis=0) * 1000
+        return {name: (p50[i], p99[i]) for i, name in enumerate(PHASES)}
+
+    def dump(self, path: str | None = None) -> str:
+        path = path or self.path
+        times = self.recorded() * 1000
+        if path.endswith(".json"):
+            with open(path, "w", encoding="UTF-8") as f:
+                json.dump({"unit": "ms", "phases": PHASES, "frames": times.round(4).tolist(),
+                           "percentiles": {name: {"p50": p50, "p99": p99}
+                                           for name, (p50, p99) in self.percentiles().items()}}, f)
+        else:
+            with open(path, "w", encoding="UTF-8", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(PHASES)
+                writer.writerows(times.round(4).tolist())
+        self.logger.info(f"Dumped {len(times)} frames to {path}")
+        return path
+
+    def process_events(self, event: pygame.event.Event):
+        if event.type != pygame.KEYDOWN:
+            return
+
+        match event.key:
+            case pygame.K_F3:
+                self.enabled = not self.enabled
+                self._overlay = None
+            case pygame.K_F4:
+                if self.count > 0:
+                    self.dump()
+
+    def draw(self, surface: pygame.Surface) -> pygame.Rect | None:
+        """Overlay in the top left corner, returning its area"""
+        if not self.enabled:
+            return None
+
+        if self._overlay is None or self.count % OVERLAY_REFRESH == 0:
+            rows = [("ms", "p50", "p99")]
+            rows += [(name, f"{p50:.2f}", f"{p99:.2f}") for name, (p50, p99) in self.percentiles().items()]
+            overlay_font = font(OVERLAY_FONT, 13)
+            height = overlay_font.get_linesize()
+            self._overlay = filled_image(190, height * len(rows) + 8, (20, 20, 20)).copy()
+            for i, row in enumerate(rows):
+                y = 4 + i * height
+                self._overlay.blit(overlay_font.render(row[0], True, (230, 230, 230)), (6, y))
+                # Numbers are right aligned on their column
+                for text, right in zip(row[1:], (124, 184)):
+                    image = overlay_font.render(text, True, (230, 230, 230))
+                    self._overlay.blit(image, (right - image.get_width(), y))
+        return surface.blit(self._overlay, (0, 0))
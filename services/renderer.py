@@ -0,0 +1,156 @@
+"""Render board diagrams to PNG files without a window, for a list of FENs or every ply of the games of a PGN.
+
+Each worker process draws with its own ``Board`` on the SDL dummy driver, so the board texture, coordinate
+glyphs and piece sprites are built once per process (the sprites are also shared on disk through the sprite
+cache). The plies of a game are drawn one after the other on the same surface, only the squares that changed
+since the previous ply are redrawn.
+
+    python -m services.renderer fens positions.txt diagrams --size 256 --workers 8
+    python -m services.renderer pgn games.pgn diagrams --limit 1000
+"""
+import argparse
+import itertools
+import os
+import time
+from typing import NamedTuple, Iterable
+
+import pygame
+
+from core.pgn import PgnGame, read_file
+from core.pool import imap_unordered
+from services.board import Board
+from services.setting import Setting
+
+THUMBNAIL_SIZE = 256
+FENS_PER_TASK = 100
+
+_renderer: "BoardRenderer | None" = None
+
+
+class Report(NamedTuple):
+    images: int
+    errors: list[str]
+
+
+def init_headless() -> None:
+    """Pygame on the dummy video and audio drivers, with a 1x1 display so surfaces can be converted to its format"""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    pygame.init()
+    if pygame.display.get_surface() is None:
+        pygame.display.set_mode((1, 1))
+
+
+class BoardRenderer:
+    """A Board without engine, socket or window drawing positions onto a size x size surface"""
+
+    def __init__(self, setting: Setting, size: int = THUMBNAIL_SIZE):
+        self.board = Board(None, setting, None)
+        self.board.drawingPos = (0, 0)
+        # Whole squares only, the board would have an undrawn edge otherwise
+        self.size = max(size - size % 8, 8)
+        self.board.screen = pygame.Surface((self.size, self.size))
+
+    def _save(self, path: str) -> None:
+        self.board.draw()
+        pygame.image.save(self.board.board, path)
+
+    def render_fen(self, fen: str, path: str) -> None:
+        self.board.set_board_by_moves((), fen)
+        self._save(path)
+
+    def render_game(self, game: PgnGame, paths: list[str]) -> None:
+        """The start position and every ply of the game, with the last move highlighted, into paths in order"""
+        self.board.set_board_by_notations(game.moves, game.fen)
+        for ply, path in enumerate(paths):
+            self.board.view(ply)
+            self._save(path)
+
+
+def _init_worker(setting_path: str, size: int) -> None:
+    global _renderer
+    init_headless()
+    _renderer = BoardRenderer(Setting(setting_path), size)
+
+
+def _render_fens(items: list[tuple[int, str, str]]) -> Report:
+    images, errors = 0, []
+    for index, fen, path in items:
+        try:
+            _renderer.render_fen(fen, path)
+            images += 1
+        except (ValueError, IndexError) as ex:
+            errors.append(f"FEN {index + 1} ({fen.strip()}): {ex}")
+    return Report(images, errors)
+
+
+def _render_game(index: int, game: PgnGame, paths: list[str]) -> Report:
+    try:
+        _renderer.render_game(game, paths)
+    except (ValueError, IndexError) as ex:
+        return Report(0, [f"game {index + 1}: {ex}"])
+    return Report(len(paths), [])
+
+
+def _run(tasks: Iterable[tuple], workers: int, setting_path: str, size: int) -> tuple[Report, float]:
+    total = Report(0, [])
+    start_time = time.perf_counter()
+    for report in imap_unordered(tasks, workers, _init_worker, (setting_path, size)):
+        total = Report(total.images + report.images, total.errors + report.errors)
+    return total, time.perf_counter() - start_time
+
+
+def render_fens(fens: Iterable[str], out_dir: str, size: int = THUMBNAIL_SIZE, workers: int = os.cpu_count() or 1,
+                setting_path: str = "setting.json") -> tuple[Report, float]:
+    """Draw the n-th FEN to out_dir/<n>.png, returning the report and the seconds taken"""
+    os.makedirs(out_dir, exist_ok=True)
+    items = ((index, fen, os.path.join(out_dir, f"{index + 1:05d}.png"))
+             for index, fen in enumerate(fen for fen in fens if fen.strip()))
+
+    def tasks():
+        while chunk := list(itertools.islice(items, FENS_PER_TASK)):
+            yield _render_fens, chunk
+
+    return _run(tasks(), workers, setting_path, size)
+
+
+def render_games(games: Iterable[PgnGame], out_dir: str, size: int = THUMBNAIL_SIZE,
+                 workers: int = os.cpu_count() or 1, setting_path: str = "setting.json") -> tuple[Report, float]:
+    """Draw every ply of the n-th game to out_dir/<n>-<ply>.png, ply 0 being the start position"""
+    os.makedirs(out_dir, exist_ok=True)
+
+    def tasks():
+        for index, game in enumerate(games):
+            paths = [os.path.join(out_dir, f"{index + 1:05d}-{ply:03d}.png") for ply in range(len(game.moves) + 1)]
+            yield _render_game, index, game, paths
+
+    return _run(tasks(), workers, setting_path, size)
+
+
+def print_report(report: Report, elapsed: float, workers: int) -> None:
+    for error in report.errors:
+        print(error)
+    print(f"{report.images} images, {len(report.errors)} errors in {elapsed:.2f}s on {workers} workers "
+          f"({report.images / max(elapsed, 1e-9):,.1f} images/s)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Render board diagrams to PNG files without opening a window")
+    parser.add_argument("source", choices=("fens", "pgn"), help="a file with one FEN per line, or a PGN file")
+    parser.add_argument("path")
+    parser.add_argument("out_dir")
+    parser.add_argument("--size", type=int, default=THUMBNAIL_SIZE, help="width and height in pixels")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--limit", type=int, help="only the first N FENs or games")
+    parser.add_argument("--setting", default="setting.json", help="colours are read from this setting file")
+    args = parser.parse_args()
+
+    if args.source == "fens":
+        with open(args.path, encoding="UTF-8") as f:
+            result, seconds = render_fens(itertools.islice(f, args.limit), args.out_dir, args.size, args.workers,
+                                          args.setting)
+    else:
+        result, seconds = render_games(itertools.islice(read_file(args.path), args.limit), args.out_dir, args.size,
+                                       args.workers, args.setting)
+    print_report(result, seconds, args.workers)
+    raise SystemExit(1 if result.errors else 0)
@@ -12,13 +12,27 @@ class Setting(BaseService):
 
         self.load()
 
-        self.HEIGHT = 800
-        self.WIDTH = 1200
+        # Window size, the board takes the height left between the two 200px side panels
+        self.HEIGHT = self.dicts.get("HEIGHT", 800)
+        self.WIDTH = self.dicts.get("WIDTH", 1200)
 
         self.color1 = '#b58863'
         self.color2 = '#f0d9b5'
 
-        self.FPS = 60
+        # Frame caps while something changes on screen, and while waiting for input or messages (0: only then)
+        self.FPS = self.dicts.get("FPS", 60)
+        self.idle_FPS = self.dicts.get("idle_FPS", 5)
+
+        # Frame time profiler, F3 toggles it and its overlay, F4 writes the last frames to profile_path (.csv or .json)
+        self.profile = self.dicts.get("profile", False)
+        self.profile_frames = self.dicts.get("profile_frames", 1200)
+        self.profile_path = self.dicts.get("profile_path", "profile.csv")
+
+        # Polyglot opening book consulted before the engine, the AI goes straight to Stockfish without it
+        self.book_path = self.dicts.get("book_path", "assets/books/book.bin")
+        # Directory of Syzygy .rtbw/.rtbz files, probed by the AI and to end the offline two player games they decide
+        self.tablebase_path = self.dicts.get("tablebase_path", "assets/syzygy")
+        self.tablebase_adjudication = self.dicts.get("tablebase_adjudication", True)
 
     def load(self):
         try: